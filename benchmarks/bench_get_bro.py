@@ -0,0 +1,59 @@
+"""
+Startup time regression benchmark for get_bro.
+
+Runs get_bro in a fresh interpreter and reports the wall time, the peak
+RSS and whether any of the plotting or image libraries were imported.
+Exits with an error if a heavy library was imported or the startup took
+longer than the limit.
+
+Usage:
+    python benchmarks/bench_get_bro.py path/to/config.yml [max_seconds]
+"""
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "colorcet",
+    "imctools",
+    "ipywidgets",
+    "matplotlib",
+    "plotnine",
+    "pycytools",
+    "seaborn",
+]
+
+CHILD = """
+import json, resource, sys, time
+t_start = time.perf_counter()
+import spherpro.bro as sbro
+bro = sbro.get_bro(sys.argv[1])
+bro.doquery(bro.session.query(sbro.db.images))
+seconds = time.perf_counter() - t_start
+print(json.dumps({
+    "seconds": seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10,
+    "heavy_modules": [m for m in sys.argv[2:] if m in sys.modules],
+}))
+"""
+
+
+def run_get_bro(fn_config):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, fn_config] + HEAVY_MODULES,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    fn_config = sys.argv[1]
+    max_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    res = run_get_bro(fn_config)
+    print(f"get_bro + first query: {res['seconds']:.2f}s")
+    print(f"peak RSS: {res['peak_rss_mb']:.0f} MB")
+    print(f"heavy modules imported: {res['heavy_modules']}")
+    if res["heavy_modules"] or res["seconds"] > max_seconds:
+        sys.exit(1)
@@ -0,0 +1,56 @@
+"""
+Benchmarks the extraction of the image metadata from 100k crop filenames
+with lib.map_group_re, compared to the former per filename implementation.
+
+Usage:
+    python benchmarks/bench_map_group_re.py [n_filenames]
+"""
+import re
+import sys
+import time
+
+import pandas as pd
+
+import spherpro.configuration as conf
+import spherpro.library as lib
+
+
+def map_group_re_loop(x, re_str):
+    """
+    The former implementation, building one dataframe per filename.
+    """
+    qre = re.compile(re_str)
+    m_list = [
+        pd.DataFrame.from_dict([m.groupdict() for m in qre.finditer(s)]) for s in x
+    ]
+    return pd.concat(m_list, ignore_index=True)
+
+
+def make_filenames(n):
+    return pd.Series(
+        [
+            f"20170905_Fluidigmworkshopfinal_SEAJa_s0_p{i % 7}_r{i % 13}_a{i % 5}"
+            f"_ac_l{i}_x{(i * 37) % 2000}_y{(i * 91) % 2000}.tiff"
+            for i in range(n)
+        ]
+    )
+
+
+def timeit(fkt, *args):
+    t_start = time.perf_counter()
+    res = fkt(*args)
+    return res, time.perf_counter() - t_start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    re_meta = conf.default_dict[conf.CPOUTPUT][conf.IMAGES_CSV][conf.META_REGEXP]
+    fns = make_filenames(n)
+
+    res_vec, t_vec = timeit(lib.map_group_re, fns, re_meta)
+    res_loop, t_loop = timeit(map_group_re_loop, fns, re_meta)
+    pd.testing.assert_frame_equal(res_vec, res_loop)
+
+    print(f"{n} filenames")
+    print(f"map_group_re:      {t_vec:.3f}s")
+    print(f"per filename loop: {t_loop:.3f}s ({t_loop / t_vec:.0f}x)")
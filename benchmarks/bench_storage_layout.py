@@ -0,0 +1,143 @@
+"""
+Benchmarks storage layouts of the measurement matrix for the access
+patterns read-one-marker (all objects, one measurement), read-one-image
+(the objects of one image, all measurements) and read-all. Contiguous
+layouts are additionally read via a memmap.
+
+The files are read back right after writing, thus mostly from the
+page cache: the timings reflect decompression and chunk overhead rather
+than disk throughput.
+
+Usage:
+    python benchmarks/bench_storage_layout.py [n_objects] [n_measurements]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+import pandas as pd
+
+import spherpro.bromodules.io_anndata as io_anndata
+import spherpro.configuration as config
+
+N_IMAGES = 100
+WRITE_CHUNKSIZE = 100000
+
+# layouts as in the measurement_layout section of the configuration
+LAYOUTS = {
+    "auto": {},
+    "contiguous": {config.CONTIGUOUS: True},
+    "rows": {config.CHUNK_COLS: None, config.CHUNK_ROWS: 1024},
+    "columns": {config.CHUNK_COLS: 1},
+    "columns lzf": {
+        config.CHUNK_COLS: 1,
+        config.COMPRESSION: io_anndata.CODEC_LZF,
+        config.SHUFFLE: True,
+    },
+    "columns gzip": {
+        config.CHUNK_COLS: 1,
+        config.COMPRESSION: io_anndata.CODEC_GZIP,
+        config.COMPRESSION_OPTS: 4,
+        config.SHUFFLE: True,
+    },
+    "blocks lzf": {
+        config.CHUNK_COLS: 8,
+        config.COMPRESSION: io_anndata.CODEC_LZF,
+        config.SHUFFLE: True,
+    },
+}
+if io_anndata.hdf5plugin is not None:
+    LAYOUTS["columns blosc"] = {
+        config.CHUNK_COLS: 1,
+        config.COMPRESSION: io_anndata.CODEC_BLOSC,
+    }
+
+
+def make_data(n_obj, n_meas, seed=0):
+    """
+    Mean intensities like values, rounded as in the cellprofiler output.
+    """
+    rng = np.random.default_rng(seed)
+    return np.round(rng.lognormal(size=(n_obj, n_meas)), 6)
+
+
+def get_layout(layout):
+    conf = {
+        config.MEASUREMENT_LAYOUT: {
+            **config.default_dict[config.MEASUREMENT_LAYOUT],
+            **layout,
+        }
+    }
+    return io_anndata.get_storage_layout(conf)
+
+
+def write(fn, x, layout):
+    var = pd.DataFrame(index=[str(i) for i in range(x.shape[1])])
+    with io_anndata.AnnDataChunkWriter(fn, var, **get_layout(layout)) as writer:
+        for start in range(0, x.shape[0], WRITE_CHUNKSIZE):
+            stop = min(start + WRITE_CHUNKSIZE, x.shape[0])
+            writer.append(pd.DataFrame(x[start:stop], index=np.arange(start, stop) + 1))
+
+
+def read_one_marker(dset, n_obj, n_meas):
+    return io_anndata._read_coalesced(dset, np.arange(n_obj), np.array([n_meas // 2]))
+
+
+def read_one_image(dset, n_obj, n_meas):
+    n_img = n_obj // N_IMAGES
+    start = n_img * (N_IMAGES // 2)
+    return io_anndata._read_coalesced(
+        dset, np.arange(start, start + n_img), np.arange(n_meas)
+    )
+
+
+def read_all(dset, n_obj, n_meas):
+    return dset[:]
+
+
+def read_one_marker_memmap(x_mm, n_obj, n_meas):
+    return np.array(x_mm[:, n_meas // 2])
+
+
+def read_one_image_memmap(x_mm, n_obj, n_meas):
+    n_img = n_obj // N_IMAGES
+    start = n_img * (N_IMAGES // 2)
+    return x_mm[start : (start + n_img), :]
+
+
+def timeit(fkt, *args):
+    t_start = time.perf_counter()
+    res = fkt(*args)
+    return res, time.perf_counter() - t_start
+
+
+if __name__ == "__main__":
+    n_obj = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    n_meas = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    x = make_data(n_obj, n_meas)
+    res = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, layout in LAYOUTS.items():
+            fn = os.path.join(tmpdir, name.replace(" ", "_") + ".h5ad")
+            _, t_write = timeit(write, fn, x, layout)
+            row = {
+                "layout": name,
+                "size_mb": os.path.getsize(fn) / 2 ** 20,
+                "write_s": t_write,
+            }
+            for fkt in [read_one_marker, read_one_image, read_all]:
+                with h5py.File(fn, "r") as f:
+                    dat, row[fkt.__name__ + "_s"] = timeit(fkt, f["X"], n_obj, n_meas)
+                assert dat.size > 0
+            with h5py.File(fn, "r") as f:
+                x_mm = io_anndata.get_memmap(f["X"])
+            for fkt in [read_one_marker_memmap, read_one_image_memmap]:
+                if x_mm is not None:
+                    dat, row[fkt.__name__ + "_s"] = timeit(fkt, x_mm, n_obj, n_meas)
+                    assert dat.size > 0
+            res.append(row)
+    print(f"{n_obj} objects x {n_meas} measurements")
+    print(pd.DataFrame(res).to_string(index=False, float_format="{:.3f}".format))
@@ -22,6 +22,7 @@ setup(
     install_requires=[
         'anndata',
         'colorcet',
+        'h5py',
         'imctools==1.0.7',
         'matplotlib',
         'numpy',
@@ -84,23 +84,12 @@ class FilterMeasurements(filter_base.BaseFilter):
         measurement_name=None,
         measurement_type=None,
     ):
-        fil = self.get_measmeta_filter_statements(
-            channel_names=[channel_name],
-            stack_names=[stack_name],
-            measurement_names=[measurement_name],
-            measurement_types=[measurement_type],
+        return self.data.catalog.get_measid(
+            channel_name=channel_name,
+            stack_name=stack_name,
+            measurement_name=measurement_name,
+            measurement_type=measurement_type,
         )
-        measid = (
-            self.data.get_measmeta_query()
-            .filter(fil)
-            .with_entities(db.measurements.measurement_id)
-            .all()
-        )
-        if len(measid) > 1:
-            raise ValueError(
-                f"Measurment not uniquely specified.\n {len(measid)} measurements found that match specification."
-            )
-        return measid[0][0]
 
 
 def get_filter_vector(anndat, filter_triplets):
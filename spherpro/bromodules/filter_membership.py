@@ -27,21 +27,14 @@ class FilterMembership(filter_base.BaseFilter):
 
         # TODO: move to config
         if measid_area is None:
-            fil = measfilts.get_measmeta_filter_statements(
-                channel_names=[obj_def[conf.DEFAULT_CHANNEL_NAME]],
-                stack_names=[obj_def[conf.DEFAULT_STACK_NAME]],
-                measurement_names=["Area"],
-                measurement_types=["AreaShape"],
+            measid_area = measfilts.measmeta_to_measid(
+                channel_name=obj_def[conf.DEFAULT_CHANNEL_NAME],
+                stack_name=obj_def[conf.DEFAULT_STACK_NAME],
+                measurement_name="Area",
+                measurement_type="AreaShape",
             )
-            measid_area = (
-                self.data.get_measmeta_query()
-                .filter(fil)
-                .with_entities(db.measurements.measurement_id)
-            ).one()[0]
-        q_meas = (
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_id == measid_area)
-            .add_columns(db.ref_stacks.scale)
+        dat_meas = self.data.catalog.get_measmeta(
+            db.ref_stacks.scale, measurement_id=measid_area
         )
 
         q_obj = self.data.get_objectmeta_query()
@@ -49,11 +42,11 @@ class FilterMembership(filter_base.BaseFilter):
         if object_type is not None:
             q_obj = q_obj.filter(db.objects.object_type == object_type)
 
-        dat_meas = self.doquery(q_meas)
         dat_obj = self.doquery(q_obj)
 
-        dat = self.bro.io.objmeasurements.get_measurements(dat_obj, dat_meas)
-        self.bro.io.objmeasurements.scale_anndata(dat)
+        dat = self.bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_meas, scale=True
+        )
 
         dat_filter = pd.DataFrame(
             {
@@ -103,14 +96,12 @@ class FilterMembership(filter_base.BaseFilter):
         col_stack = "BinStack"
         outcol_issphere = "is-sphere"
         non_zero_offset = 1 / 2 ** 20
-        dat_meas = self.doquery(
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_name == col_measure)
-            .filter(db.stacks.stack_name == col_stack)
-            .filter(
-                db.ref_planes.channel_name.in_([col_isother, col_issphere, col_isbg])
-            )
-            .add_columns(db.ref_stacks.scale, db.ref_planes.channel_name)
+        dat_meas = self.data.catalog.get_measmeta(
+            db.ref_stacks.scale,
+            db.ref_planes.channel_name,
+            measurement_name=col_measure,
+            stack_name=col_stack,
+            channel_name=[col_isother, col_issphere, col_isbg],
         )
         dat_obj = self.doquery(
             self.data.get_objectmeta_query().filter(
@@ -119,9 +110,10 @@ class FilterMembership(filter_base.BaseFilter):
         )
         logging.debug(f"{dat_obj.shape}")
 
-        dat = self.bro.io.objmeasurements.get_measurements(dat_obj, dat_meas)
+        dat = self.bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_meas, scale=True
+        )
         logging.debug(f"{dat.shape}")
-        self.bro.io.objmeasurements.scale_anndata(dat)
 
         fil_issphere, fil_isbg, fil_isother = (
             dat.var[db.ref_planes.channel_name.key] == c
@@ -156,30 +148,24 @@ class FilterMembership(filter_base.BaseFilter):
         col_measure = "MeanIntensity"
         col_stack = "DistStack"
         col_distother = "dist-other"
-        measid = (
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_name == col_measure)
-            .filter(db.stacks.stack_name == col_stack)
-            .filter(db.ref_planes.channel_name == col_distother)
-            .with_entities(db.measurements.measurement_id)
-            .one()[0]
+        measid = self.data.catalog.get_measid(
+            measurement_name=col_measure,
+            stack_name=col_stack,
+            channel_name=col_distother,
         )
-
-        q_meas = (
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_id == measid)
-            .add_columns(db.ref_stacks.scale)
+        dat_meas = self.data.catalog.get_measmeta(
+            db.ref_stacks.scale, measurement_id=measid
         )
         q_obj = self.data.get_objectmeta_query()
 
         if object_type is not None:
             q_obj = q_obj.filter(db.objects.object_type == object_type)
 
-        dat_meas = self.doquery(q_meas)
         dat_obj = self.doquery(q_obj)
 
-        dat = self.bro.io.objmeasurements.get_measurements(dat_obj, dat_meas)
-        self.bro.io.objmeasurements.scale_anndata(dat)
+        dat = self.bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_meas, scale=True
+        )
 
         d = dat[:, str(measid)].X.squeeze()
         dat_filter = pd.DataFrame(
@@ -201,29 +187,24 @@ class FilterMembership(filter_base.BaseFilter):
         col_stack = "DistStack"
         col_distsphere = "dist-sphere"
 
-        measid = (
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_name == col_measure)
-            .filter(db.stacks.stack_name == col_stack)
-            .filter(db.ref_planes.channel_name == col_distsphere)
-            .with_entities(db.measurements.measurement_id)
-            .one()[0]
+        measid = self.data.catalog.get_measid(
+            measurement_name=col_measure,
+            stack_name=col_stack,
+            channel_name=col_distsphere,
         )
-        q_meas = (
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_id == measid)
-            .add_columns(db.ref_stacks.scale)
+        dat_meas = self.data.catalog.get_measmeta(
+            db.ref_stacks.scale, measurement_id=measid
         )
         q_obj = self.data.get_objectmeta_query()
 
         if object_type is not None:
             q_obj = q_obj.filter(db.objects.object_type == object_type)
 
-        dat_meas = self.doquery(q_meas)
         dat_obj = self.doquery(q_obj)
 
-        dat = self.bro.io.objmeasurements.get_measurements(dat_obj, dat_meas)
-        self.bro.io.objmeasurements.scale_anndata(dat)
+        dat = self.bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_meas, scale=True
+        )
 
         d = dat[:, str(measid)].X.squeeze()
         dat_filter = pd.DataFrame(
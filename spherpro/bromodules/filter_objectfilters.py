@@ -132,3 +132,4 @@ class ObjectFilterLib(filter_base.BaseFilter):
         )
         stmt.delete(synchronize_session="fetch")
         self.session.commit()
+        self.data.refresh_object_validity()
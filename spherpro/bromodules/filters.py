@@ -1,10 +1,15 @@
-import spherpro.bromodules.filter_measurements as filter_measurements
-import spherpro.bromodules.filter_membership as filter_membership
-import spherpro.bromodules.filter_objectfilters as filter_objectfilters
+import spherpro.bromodules.lazy as lazy
 
 
-class Filters(object):
-    def __init__(self, bro):
-        self.membership = filter_membership.FilterMembership(bro)
-        self.measurements = filter_measurements.FilterMeasurements(bro)
-        self.objectfilterlib = filter_objectfilters.ObjectFilterLib(bro)
+class Filters(lazy.LazyNamespace):
+    MODULES = {
+        "membership": ("spherpro.bromodules.filter_membership", "FilterMembership"),
+        "measurements": (
+            "spherpro.bromodules.filter_measurements",
+            "FilterMeasurements",
+        ),
+        "objectfilterlib": (
+            "spherpro.bromodules.filter_objectfilters",
+            "ObjectFilterLib",
+        ),
+    }
@@ -1,8 +1,8 @@
-import spherpro.bromodules.helpers_anndata as ha
-import spherpro.bromodules.helpers_varia as hv
+import spherpro.bromodules.lazy as lazy
 
 
-class Helpers(object):
-    def __init__(self, bro):
-        self.dbhelp = hv.HelperDb(bro)
-        self.anndata = ha
+class Helpers(lazy.LazyNamespace):
+    MODULES = {
+        "dbhelp": ("spherpro.bromodules.helpers_varia", "HelperDb"),
+        "anndata": ("spherpro.bromodules.helpers_anndata", None),
+    }
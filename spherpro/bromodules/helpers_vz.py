@@ -150,7 +150,8 @@ class HelperVZ(pltbase.BasePlot):
             q_obj = q_obj.add_columns(db.objects.image_id)
         if (curcond is not None) or (cond_ids is not None):
             q_obj = q_obj.join(
-                db.conditions, db.images.condition_id == db.conditions.condition_id
+                db.conditions,
+                db.object_meta.condition_id == db.conditions.condition_id,
             )
             if curcond is not None:
                 q_obj = q_obj.filter(db.conditions.condition_name == curcond)
@@ -172,15 +173,18 @@ class HelperVZ(pltbase.BasePlot):
         dat_meas = self.bro.doquery(q_meta)
         dat_obj = self.bro.doquery(q_obj)
 
-        dat = self.bro.io.objmeasurements.get_measurements(dat_obj, dat_meas)
-        dat = self.bro.io.objmeasurements.scale_anndata(dat)
+        dat = self.bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_meas, scale=True
+        )
 
         if legacy:
-            d = pd.DataFrame(
-                dat.X, index=dat.obs.object_id, columns=dat.var.measurement_id
-            ).stack()
-            d.name = V.COL_VALUE
-            dat = d.reset_index().merge(dat_obj)
+            dat = self.bro.io.objmeasurements.convert_anndata_longform(
+                dat,
+                obs_cols=[c for c in dat_obj.columns if c != db.objects.object_id.key],
+                var_cols=[],
+                value_col=V.COL_VALUE,
+                categorical=False,
+            )
         return dat
 
     def get_d2rim(self):
@@ -344,10 +348,8 @@ class HelperVZ(pltbase.BasePlot):
         return dat_full_objmeta
 
     def get_full_meas_meta(self):
-        dat_measmeta = self.bro.doquery(
-            self.bro.data.get_measmeta_query().add_columns(
-                db.stacks.stack_name, db.ref_planes.channel_name
-            )
+        dat_measmeta = self.bro.data.catalog.get_measmeta(
+            db.stacks.stack_name, db.ref_planes.channel_name
         )
         dat_full_measmeta = (
             dat_measmeta.merge(
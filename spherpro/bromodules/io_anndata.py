@@ -1,18 +1,66 @@
 """
 A class to handle Anndata as a backend
 """
+import concurrent.futures
+import importlib
+import logging
+import os
 import pathlib
 import shutil
-import time
 
 import anndata as ad
+import h5py
 import numpy as np
 import pandas as pd
 
+try:
+    from anndata.experimental import read_elem, write_elem
+except ImportError:  # anndata < 0.8
+    from anndata._io.h5ad import read_attribute as read_elem
+    from anndata._io.h5ad import write_attribute as write_elem
+
+try:
+    import hdf5plugin  # registers additional codecs, e.g. blosc
+except ImportError:
+    hdf5plugin = None
+
+import spherpro.bromodules.io_backups as io_backups
 import spherpro.bromodules.io_base as io_base
+import spherpro.bromodules.io_versions as io_versions
+import spherpro.configuration as config
 import spherpro.db as db
 
 SUFFIX_ANNDATA = ".h5ad"
+ENCODING_TYPE = "encoding-type"
+ENCODING_VERSION = "encoding-version"
+SUFFIX_POSITION_INDEX = ".posidx.npz"
+
+# measurement stores: name: (module, class)
+MEASUREMENT_STORES = {
+    config.MEASUREMENT_STORE_ANNDATA: ("spherpro.bromodules.io_anndata", "IoAnnData"),
+    config.MEASUREMENT_STORE_COLUMNS: (
+        "spherpro.bromodules.io_columnstore",
+        "IoColumnStore",
+    ),
+    config.MEASUREMENT_STORE_ZARR: ("spherpro.bromodules.io_zarrstore", "IoZarrStore"),
+}
+
+# gaps between requested rows/columns up to which reads are merged
+MAX_ROW_GAP = 256
+MAX_COL_GAP = 16
+# maximum number of rows read at once
+BLOCK_ROWS = 2 ** 16
+# elements per chunk if only one chunk dimension is configured
+CHUNK_SIZE = 2 ** 16
+
+# marks anndatas whose measurements are scaled already
+UNS_SCALED = "scaled"
+# base of a version writer: the version current when the writer is created
+BASE_CURRENT = "current"
+
+CODEC_LZF = "lzf"
+CODEC_GZIP = "gzip"
+CODEC_BLOSC = "blosc"
 
 
 def get_anndata_filename(conf: object, object_type: str):
@@ -20,13 +68,295 @@ def get_anndata_filename(conf: object, object_type: str):
     return fn
 
 
+def get_measurement_store_class(conf):
+    """
+    Returns the class of the measurement store configured
+    """
+    store = conf[config.MEASUREMENT_STORE]
+    if store not in MEASUREMENT_STORES:
+        raise ValueError(
+            f"Unknown measurement store {store},"
+            f" valid are: {list(MEASUREMENT_STORES.keys())}"
+        )
+    module, cls = MEASUREMENT_STORES[store]
+    return getattr(importlib.import_module(module), cls)
+
+
+def get_measurement_store(bro, obj_type):
+    """
+    Returns the measurement store of an object type
+    """
+    return get_measurement_store_class(bro.data.conf)(bro, obj_type)
+
+
+def get_measurement_writer(conf, obj_type, var):
+    """
+    Returns a chunk writer initializing the measurement
+    store of an object type.
+    """
+    return get_measurement_store_class(conf).get_writer(conf, obj_type, var)
+
+
+def get_compression(codec, opts=None, shuffle=False):
+    """
+    Returns the h5py dataset options of a codec
+
+    Args:
+        codec: None, 'lzf', 'gzip' or 'blosc'
+        opts: the options of the codec, e.g. the gzip level or
+            a dict of hdf5plugin.Blosc arguments
+        shuffle: should the shuffle filter be applied?
+    """
+    if codec == CODEC_BLOSC:
+        if hdf5plugin is None:
+            raise ValueError("The blosc codec requires the hdf5plugin package.")
+        return {"compression": hdf5plugin.Blosc(**(opts or {})), "shuffle": shuffle}
+    if codec not in (None, CODEC_LZF, CODEC_GZIP):
+        raise ValueError(
+            f"Unknown codec {codec},"
+            f" valid are: {[None, CODEC_LZF, CODEC_GZIP, CODEC_BLOSC]}"
+        )
+    return {"compression": codec, "compression_opts": opts, "shuffle": shuffle}
+
+
+def get_measurement_dtype(conf):
+    """
+    Returns the configured dtype of the measurements
+    """
+    dtype = np.dtype(conf[config.MEASUREMENT_LAYOUT][config.DTYPE])
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError(f"The measurements need a float dtype, not {dtype}.")
+    return dtype
+
+
+def get_storage_layout(conf):
+    """
+    Returns the dataset options of the configured measurement layout
+    as accepted by the chunk writers.
+    """
+    layout = conf[config.MEASUREMENT_LAYOUT]
+    contiguous = layout[config.CONTIGUOUS]
+    if contiguous and any(
+        layout[key]
+        for key in [config.COMPRESSION, config.CHUNK_ROWS, config.CHUNK_COLS]
+    ):
+        raise ValueError(
+            "A contiguous measurement layout can not be compressed or chunked."
+        )
+    return {
+        "dtype": get_measurement_dtype(conf),
+        **get_compression(
+            layout[config.COMPRESSION],
+            layout[config.COMPRESSION_OPTS],
+            layout[config.SHUFFLE],
+        ),
+        "chunk_rows": layout[config.CHUNK_ROWS],
+        "chunk_cols": layout[config.CHUNK_COLS],
+        "contiguous": contiguous,
+    }
+
+
+def get_chunks(ncol, chunk_rows=None, chunk_cols=None):
+    """
+    Returns the chunk shape of a measurement matrix with ncol columns,
+    True to let h5py choose it.
+    """
+    if ((chunk_rows is None) and (chunk_cols is None)) or (ncol == 0):
+        return True
+    chunk_cols = min(chunk_cols or ncol, ncol)
+    if chunk_rows is None:
+        chunk_rows = max(1, CHUNK_SIZE // chunk_cols)
+    return (chunk_rows, chunk_cols)
+
+
+def get_memmap(dset):
+    """
+    Returns a read only numpy.memmap of a 2D HDF5 dataset.
+
+    Only uncompressed, contiguous datasets can be mapped, the memmap
+    is a zero copy view of the file in the page cache.
+
+    Args:
+        dset: an h5py dataset
+
+    Returns:
+        the memmap, None if the dataset can not be mapped
+    """
+    if (
+        (dset.chunks is not None)
+        or (dset.file.driver != "sec2")
+        or (dset.dtype.kind != "f")
+        or (dset.size == 0)
+    ):
+        return None
+    offset = dset.id.get_offset()
+    if offset is None:  # no storage allocated
+        return None
+    return np.memmap(
+        dset.file.filename, mode="r", dtype=dset.dtype, shape=dset.shape, offset=offset
+    )
+
+
+def get_position_index_filename(filename):
+    return pathlib.Path(str(filename) + SUFFIX_POSITION_INDEX)
+
+
+def get_anndata_versions(filename):
+    """
+    Returns the io_versions.FileVersions of an anndata file
+    """
+    return io_versions.FileVersions(filename, sidecars=[SUFFIX_POSITION_INDEX])
+
+
 def scale_anndata(adat, col_scale=db.ref_stacks.scale.key, inplace=True):
+    """
+    Scales the measurements by the scale of their reference stacks.
+
+    The columns are multiplied in place if possible, otherwise into a
+    single new array of the dtype of X, e.g. float32 stays float32.
+    Anndatas marked as scaled in adat.uns are not scaled again.
+
+    Args:
+        adat: an anndata with the scale as a var column
+        col_scale: the var column with the scale
+        inplace: scale adat itself or a copy?
+
+    Returns:
+        the scaled anndata
+    """
+    if adat.uns.get(UNS_SCALED, False):
+        return adat
     if not inplace:
         adat = adat.copy()
-    adat.X = (adat.X.T * adat.var[col_scale][:, None]).T
+    if col_scale not in adat.var.columns:
+        raise ValueError(f"The var needs a {col_scale} column for scaling.")
+    scale = adat.var[col_scale].to_numpy(dtype=np.float64)
+    x = adat.X
+    if not np.issubdtype(x.dtype, np.floating):
+        # integer measurements are scaled to floats
+        adat.X = np.asarray(x) * scale
+    elif (not adat.is_view) and isinstance(x, np.ndarray) and x.flags.writeable:
+        np.multiply(x, scale, out=x, casting="same_kind")
+    else:
+        # e.g. read only memory maps: one new array of the dtype of X
+        adat.X = np.multiply(np.asarray(x), scale, dtype=x.dtype, casting="same_kind")
+    adat.uns[UNS_SCALED] = True
     return adat
 
 
+def convert_anndata_longform(
+    adat,
+    obs_cols=None,
+    var_cols=None,
+    value_col=db.object_measurements.value.key,
+    categorical=True,
+    dropna=True,
+):
+    """
+    Converts an anndata into a long form table with one row per
+    object and measurement.
+
+    The columns are built by repeating the obs and tiling the var
+    columns, without stacking and merging.
+
+    Args:
+        adat: the anndata
+        obs_cols: the obs columns to be added, None: all
+        var_cols: the var columns to be added, None: all
+        value_col: the name of the value column
+        categorical: should string columns be returned as categoricals?
+        dropna: should missing values be dropped?
+
+    Returns:
+        a dataframe with the object_id, measurement_id, value
+        and the requested obs and var columns
+    """
+    return next(
+        iter_anndata_longform(
+            adat,
+            max(adat.shape[0], 1),
+            obs_cols=obs_cols,
+            var_cols=var_cols,
+            value_col=value_col,
+            categorical=categorical,
+            dropna=dropna,
+        )
+    )
+
+
+def iter_anndata_longform(
+    adat,
+    chunksize,
+    obs_cols=None,
+    var_cols=None,
+    value_col=db.object_measurements.value.key,
+    categorical=True,
+    dropna=True,
+):
+    """
+    Yields the long form table of an anndata in chunks of objects,
+    see convert_anndata_longform.
+
+    Args:
+        chunksize: the number of objects per chunk
+    """
+    obs_id = db.objects.object_id.key
+    var_id = db.measurements.measurement_id.key
+    if obs_cols is None:
+        obs_cols = [c for c in adat.obs.columns if c != obs_id]
+    if var_cols is None:
+        var_cols = [c for c in adat.var.columns if c != var_id]
+    obs = _get_longform_columns(adat.obs, obs_cols, categorical)
+    var = _get_longform_columns(adat.var, var_cols, categorical)
+    obj_ids = as_ids(adat.obs.index)
+    meas_ids = as_ids(adat.var.index)
+    nvar = adat.shape[1]
+    for start in range(0, max(adat.shape[0], 1), chunksize):
+        x = np.asarray(adat.X[start : (start + chunksize)])
+        values = x.reshape(-1)
+        obs_idx = np.repeat(np.arange(start, start + x.shape[0]), nvar)
+        var_idx = np.tile(np.arange(nvar), x.shape[0])
+        if dropna:
+            fil = ~np.isnan(values)
+            values, obs_idx, var_idx = values[fil], obs_idx[fil], var_idx[fil]
+        yield pd.DataFrame(
+            {
+                obs_id: obj_ids[obs_idx],
+                var_id: meas_ids[var_idx],
+                value_col: values,
+                **_take_longform_columns(obs, obs_idx),
+                **_take_longform_columns(var, var_idx),
+            }
+        )
+
+
+def _get_longform_columns(dat, cols, categorical):
+    """
+    Prepares columns to be taken by position: categorical columns,
+    and string columns if categorical, are represented by their codes.
+    """
+    columns = {}
+    for col in cols:
+        c = dat[col]
+        if isinstance(c.dtype, pd.CategoricalDtype) or (
+            categorical and c.dtype == object
+        ):
+            c = c.astype("category")
+            columns[col] = (c.cat.codes.to_numpy(), c.dtype)
+        else:
+            columns[col] = (c.to_numpy(), None)
+    return columns
+
+
+def _take_longform_columns(columns, idx):
+    return {
+        col: values[idx]
+        if dtype is None
+        else pd.Categorical.from_codes(values[idx], dtype=dtype)
+        for col, (values, dtype) in columns.items()
+    }
+
+
 def copy_in_memory(adat):
     """
     Copies an adat into memory
@@ -40,47 +370,720 @@ def copy_in_memory(adat):
     return ad.AnnData(np.array(adat.X), obs=adat.obs, var=adat.var, varm=adat.varm)
 
 
+class AnnDataChunkWriter:
+    """
+    Writes an anndata file chunk by chunk.
+
+    The X matrix is written to a resizable HDF5 dataset, thus only the
+    current chunk needs to be kept in memory. The obs and var annotations
+    are written when the writer is closed.
+
+    A contiguous X can not be resized, thus the rows are staged in a
+    temporary file and copied to a contiguous X when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        filename,
+        var,
+        dtype=np.float64,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        chunk_rows=None,
+        chunk_cols=None,
+        contiguous=False,
+    ):
+        """
+        Args:
+            filename: the anndata file to be written
+            var: the var dataframe. The index needs to match the columns
+                of the chunks that will be appended.
+            dtype: the dtype of the X matrix
+            compression, compression_opts, shuffle: the h5py compression
+                options of the X matrix, see get_compression
+            chunk_rows, chunk_cols: the chunk shape of the X matrix,
+                None to choose automatically
+            contiguous: should X be stored contiguously, such that it
+                can be memory mapped? See get_memmap.
+        """
+        self.filename = filename
+        self.var = var
+        self._obs_names = []
+        self._file = h5py.File(filename, "w")
+        self._stage = None
+        if contiguous:
+            self._stage = h5py.File(f"{filename}.stage.tmp", "w")
+        self._x = (self._stage or self._file).create_dataset(
+            "X",
+            shape=(0, len(var.index)),
+            maxshape=(None, len(var.index)),
+            dtype=dtype,
+            chunks=get_chunks(len(var.index), chunk_rows, chunk_cols),
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+        )
+
+    def append(self, data):
+        """
+        Appends a chunk of observations
+        Args:
+            data: a dataframe with the obs names as index and the var
+                names as columns
+        """
+        data = data.reindex(columns=self.var.index)
+        nstart = self._x.shape[0]
+        nrow = data.shape[0]
+        self._x.resize(nstart + nrow, axis=0)
+        self._x[nstart : (nstart + nrow), :] = data.values
+        self._obs_names.append(data.index.map(str))
+
+    def _close_stage(self):
+        fn_stage = self._stage.filename
+        self._stage.close()
+        os.remove(fn_stage)
+
+    def close(self):
+        """
+        Writes the annotations and closes the file.
+        """
+        if self._stage is not None:
+            x = self._file.create_dataset("X", shape=self._x.shape, dtype=self._x.dtype)
+            for start in range(0, x.shape[0], BLOCK_ROWS):
+                x[start : (start + BLOCK_ROWS)] = self._x[start : (start + BLOCK_ROWS)]
+            self._close_stage()
+            self._x = x
+        if len(self._obs_names) > 0:
+            obs_names = np.concatenate(self._obs_names)
+        else:
+            obs_names = []
+        obs = pd.DataFrame(
+            index=pd.Index(obs_names, dtype=str, name=db.objects.object_id.key)
+        )
+        self._x.attrs.update({ENCODING_TYPE: "array", ENCODING_VERSION: "0.2.0"})
+        write_elem(self._file, "obs", obs)
+        write_elem(self._file, "var", self.var)
+        self._file.attrs.update({ENCODING_TYPE: "anndata", ENCODING_VERSION: "0.1.0"})
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            if self._stage is not None:
+                self._close_stage()
+
+
+class VersionedAnnDataWriter(AnnDataChunkWriter):
+    """
+    Writes a new version of an anndata file chunk by chunk.
+
+    The version is published when the writer is closed, see
+    io_versions.FileVersions, and the previous version is replaced by
+    a backup, see io_backups.MeasurementBackups. Publishing fails if an
+    other version was published in the meantime.
+    """
+
+    def __init__(
+        self, filename, var, delta=None, retention=None, base=BASE_CURRENT, **layout
+    ):
+        """
+        Args:
+            filename: the unversioned anndata file
+            var, layout: see AnnDataChunkWriter
+            delta: the io_backups.Delta from the previous version,
+                None to back up the whole previous version
+            retention: the retention of the backups,
+                see io_backups.get_backup_retention
+            base: the generation the new version is based on, None if
+                the file was not written before. By default the version
+                current when the writer is created.
+        """
+        self.versions = get_anndata_versions(filename)
+        self.backups = io_backups.MeasurementBackups(self.versions)
+        self.delta = delta
+        self.retention = retention or {}
+        if base == BASE_CURRENT:
+            base = self.versions.current_generation
+        self.base = base
+        self.generation, fn = self.versions.reserve()
+        try:
+            super().__init__(fn, var, **layout)
+        except Exception:
+            self.versions.discard(self.generation)
+            raise
+
+    def close(self):
+        super().close()
+        try:
+            self.backups.publish(
+                self.generation, self.base, self.delta, **self.retention
+            )
+        except Exception:
+            self.versions.discard(self.generation)
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            self.versions.discard(self.generation)
+
+
+class PositionIndex:
+    """
+    Maps integer object and measurement ids to the row and column
+    positions of an anndata file.
+
+    The index is persisted next to the anndata file and rebuilt if
+    the anndata file changed.
+    """
+
+    def __init__(self, obs_ids, var_ids, key=None):
+        """
+        Args:
+            obs_ids: the object ids of the rows
+            var_ids: the measurement ids of the columns
+            key: identifies the version of the anndata file the index
+                was built from
+        """
+        self.obs_ids = np.asarray(obs_ids, dtype=np.int64)
+        self.var_ids = np.asarray(var_ids, dtype=np.int64)
+        self.key = key
+        self._obs_order = np.argsort(self.obs_ids, kind="stable")
+        self._obs_sorted = self.obs_ids[self._obs_order]
+        self._var_order = np.argsort(self.var_ids, kind="stable")
+        self._var_sorted = self.var_ids[self._var_order]
+
+    @classmethod
+    def from_h5ad(cls, filename, key=None):
+        with h5py.File(filename, "r") as f:
+            obs_ids = _read_index_ids(f["obs"])
+            var_ids = _read_index_ids(f["var"])
+        return cls(obs_ids, var_ids, key=key)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads the persisted index of an anndata file, building and
+        persisting it if missing or outdated.
+
+        Args:
+            filename: the anndata file
+
+        Returns:
+            the PositionIndex
+        """
+        key = get_file_key(filename)
+        fn_idx = get_position_index_filename(filename)
+        try:
+            with np.load(fn_idx) as f:
+                if np.array_equal(f["key"], key):
+                    return cls(f["obs_ids"], f["var_ids"], key=key)
+        except (OSError, KeyError, ValueError):
+            pass
+        posidx = cls.from_h5ad(filename, key=key)
+        posidx.save(fn_idx)
+        return posidx
+
+    def save(self, filename):
+        """
+        Persists the index, a failure to write it is not fatal.
+        """
+        fn_tmp = f"{filename}.tmp"
+        try:
+            with open(fn_tmp, "wb") as f:
+                np.savez(f, key=self.key, obs_ids=self.obs_ids, var_ids=self.var_ids)
+            os.replace(fn_tmp, filename)
+        except OSError as e:
+            logging.debug(f"Position index {filename} not written: {e}")
+
+    def get_obs_positions(self, ids):
+        """
+        Returns the row positions of object ids and a mask
+        indicating which ids were found.
+        """
+        return _lookup_positions(ids, self._obs_sorted, self._obs_order)
+
+    def get_var_positions(self, ids):
+        """
+        Returns the column positions of measurement ids and a mask
+        indicating which ids were found.
+        """
+        return _lookup_positions(ids, self._var_sorted, self._var_order)
+
+
 class IoAnnData(io_base.BaseIo):
+    """
+    Stores the measurements of an object type in an anndata file.
+
+    Writes create a new version of the file, see io_versions. Anndatas
+    handed out keep the version they were opened with. Previous versions
+    are kept as backups of the changes, see io_backups.
+    """
+
+    writer = VersionedAnnDataWriter
+    get_filename = staticmethod(get_anndata_filename)
+    get_layout = staticmethod(get_storage_layout)
+
     def __init__(self, bro, obj_type):
         super().__init__(bro)
         self.obj_type = obj_type
         self._adat = None
+        self._adat_filename = None
+        self._adat_generation = None
+        self._position_index = None
+        self._memmap = (None, None)
 
     @property
     def filename(self):
         """
-        Filename of the file backing the anndata frame
+        Unversioned filename of the anndata file
+        """
+        return self.get_filename(self.bro.data.conf, self.obj_type)
+
+    @classmethod
+    def get_writer(cls, conf, obj_type, var):
+        """
+        Returns a chunk writer initializing the anndata file
         """
-        return get_anndata_filename(self.bro.data.conf, self.obj_type)
+        return cls.writer(
+            cls.get_filename(conf, obj_type),
+            var,
+            retention=io_backups.get_backup_retention(conf),
+            **cls.get_layout(conf),
+        )
+
+    @property
+    def versions(self):
+        """
+        The versions of the anndata file
+        """
+        return get_anndata_versions(self.filename)
+
+    @property
+    def backups(self):
+        """
+        The backups of the previous versions
+        """
+        return io_backups.MeasurementBackups(self.versions)
+
+    @property
+    def retention(self):
+        """
+        The configured retention of the backups
+        """
+        return io_backups.get_backup_retention(self.bro.data.conf)
+
+    @property
+    def layout(self):
+        """
+        The configured storage layout
+        """
+        return self.get_layout(self.bro.data.conf)
 
     def initialize_anndata(self, data, var=None, obs=None):
-        adat = ad.AnnData(data, var=var, obs=obs)
-        adat.write(self.filename)
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame(data, index=obs.index, columns=var.index)
+        data = data.rename(columns=str)
+        with self.writer(
+            self.filename,
+            pd.DataFrame(index=data.columns),
+            retention=self.retention,
+            **self.layout,
+        ) as writer:
+            writer.append(data)
+
+    def initialize_anndata_chunked(self, chunks, var):
+        """
+        Initializes the anndata file from an iterable of chunks.
+
+        Peak memory depends on the size of a chunk only.
+
+        Args:
+            chunks: an iterable of dataframes with the object ids as index
+                and the measurement ids as columns
+            var: the var dataframe, indexed by the measurement ids as
+                strings
+        """
+        with self.writer(
+            self.filename, var, retention=self.retention, **self.layout
+        ) as writer:
+            for chunk in chunks:
+                writer.append(chunk.rename(columns=str))
+
+    def append_anndata_chunked(self, chunks):
+        """
+        Appends observations to the anndata file from an iterable of chunks.
+
+        The current version is copied to a new version, to which the rows
+        are appended in place if the X matrix is resizable and the chunks
+        contain no new measurements, otherwise it is first rewritten in
+        a resizable layout. Measurements missing in a chunk are stored
+        as NaN. Only the ids of the added rows and columns are kept as
+        backup.
+
+        Args:
+            chunks: an iterable of dataframes with the object ids as index
+                and the measurement ids as columns
+        """
+        versions = self.versions
+        manifest = versions.get_current()
+        if manifest is None:
+            base = fn_current = None
+        else:
+            base = manifest[io_versions.GENERATION]
+            fn_current = versions.filename.with_name(manifest[io_versions.FILENAME])
+        generation, fn = versions.reserve()
+        f = None
+        obs_names = []
+        try:
+            if fn_current is not None:
+                shutil.copyfile(fn_current, fn)
+            for chunk in chunks:
+                chunk = chunk.rename(columns=str)
+                if (f is None) or (not chunk.columns.isin(var.index).all()):
+                    if f is not None:
+                        _append_obs_names(f, obs_names)
+                        f.close()
+                        f = None
+                        obs_names = []
+                    self._prepare_append(fn, chunk.columns)
+                    f = h5py.File(fn, "r+")
+                    var = read_elem(f["var"])
+                x = f["X"]
+                nstart = x.shape[0]
+                x.resize(nstart + chunk.shape[0], axis=0)
+                x[nstart:, :] = chunk.reindex(columns=var.index).values
+                obs_names.append(chunk.index.map(str))
+            if f is not None:
+                _append_obs_names(f, obs_names)
+                f.close()
+                f = None
+        except Exception:
+            if f is not None:
+                f.close()
+            versions.discard(generation)
+            raise
+        if not h5py.is_hdf5(fn):  # no chunks
+            versions.discard(generation)
+            return
+        posidx = PositionIndex.from_h5ad(fn)
+        if fn_current is not None:
+            posidx_old = self._get_position_index(fn_current)
+            delta = io_backups.Delta(
+                np.setdiff1d(posidx.obs_ids, posidx_old.obs_ids),
+                np.setdiff1d(posidx.var_ids, posidx_old.var_ids),
+            )
+        else:
+            delta = None
+        try:
+            self.backups.publish(generation, base, delta, **self.retention)
+        except Exception:
+            versions.discard(generation)
+            raise
+
+    def _prepare_append(self, fn, var_names):
+        """
+        Makes sure the anndata file fn is initialized, contains the
+        variables var_names and has a resizable X matrix, rewriting
+        it if needed. A contiguous X is not resizable, thus appended
+        files are chunked until they are rewritten.
+        """
+        fn = pathlib.Path(fn)
+        layout = dict(self.layout, contiguous=False)
+        if not h5py.is_hdf5(fn):
+            var = pd.DataFrame(index=sorted(var_names, key=int))
+            AnnDataChunkWriter(fn, var, **layout).close()
+            return
+        with h5py.File(fn, "r") as f:
+            x = f["X"]
+            resizable = isinstance(x, h5py.Dataset) and x.maxshape[0] is None
+            var = read_elem(f["var"])
+        if resizable and set(var_names).issubset(var.index):
+            return
+        adat = ad.read_h5ad(fn)
+        var = adat.var.reindex(sorted(set(adat.var.index).union(var_names), key=int))
+        fn_tmp = fn.with_name(fn.name + ".tmp")
+        with AnnDataChunkWriter(fn_tmp, var, **layout) as writer:
+            writer.append(
+                pd.DataFrame(
+                    np.asarray(adat.X), index=adat.obs.index, columns=adat.var.index
+                )
+            )
+        os.replace(fn_tmp, fn)
 
     @property
     def adat(self):
+        """
+        The current version as a backed anndata
+
+        A new version is opened once published, anndatas of
+        older versions stay valid.
+        """
+        versions = self.versions
+        manifest = versions.get_current()
+        if manifest is None:
+            raise FileNotFoundError(f"{self.filename} was not written yet.")
+        fn = versions.filename.with_name(manifest[io_versions.FILENAME])
         a = self._adat
-        if (a is None) or (  # Check if the data has been already loaded
-            len(a.obs.index) != a.shape[0]
-        ) | (
-            len(a.var.index) != a.shape[1]
+        if (
+            (a is None)  # Check if the data has been already loaded
+            or (fn != self._adat_filename)  # check if a new version was published
+            or (len(a.obs.index) != a.shape[0])
+            or (len(a.var.index) != a.shape[1])
         ):  # check if data consistent
-            self._adat = ad.read_h5ad(self.filename, backed="r")
+            self._adat = ad.read_h5ad(fn, backed="r")
+            self._adat_filename = fn
+            self._adat_generation = manifest[io_versions.GENERATION]
         return self._adat
 
+    @property
+    def position_index(self):
+        """
+        The PositionIndex of the current version
+        """
+        return self._get_position_index(self.versions.current_filename)
+
+    def _get_position_index(self, filename):
+        posidx = self._position_index
+        if (posidx is None) or (not np.array_equal(posidx.key, get_file_key(filename))):
+            self._position_index = PositionIndex.load(filename)
+        return self._position_index
+
+    def read_measurements(self, obj_ids, meas_ids):
+        """
+        Reads the values of objects and measurements.
+
+        The ids are mapped to positions via the position index and the
+        values are read as sorted, coalesced blocks. If X can be memory
+        mapped, the values are taken from the memmap instead, as a zero
+        copy, copy on write view if the objects and measurements are
+        contiguous. The returned X is always writable and independent
+        of the file.
+
+        Args:
+            obj_ids: object ids, all need to be present in the file
+            meas_ids: measurement ids, ids not present in the file
+                are ignored
+
+        Returns:
+            an anndata with the objects as obs and the measurements as
+            var, both sorted by id.
+        """
+        # the position index of the same version as adat
+        adat = self.adat
+        posidx = self._get_position_index(self._adat_filename)
+        obj_ids = np.unique(as_ids(obj_ids))
+        meas_ids = np.unique(as_ids(meas_ids))
+        rows, found = posidx.get_obs_positions(obj_ids)
+        if not found.all():
+            raise KeyError(
+                f"Objects {obj_ids[~found][:10]} not found in {self._adat_filename}"
+            )
+        cols, found = posidx.get_var_positions(meas_ids)
+        cols = cols[found]
+        x_mm = self.memmap
+        if x_mm is not None:
+            x = _take_memmap(x_mm, rows, cols)
+        else:
+            row_order = np.argsort(rows)
+            col_order = np.argsort(cols)
+            x = np.empty((len(rows), len(cols)), dtype=adat.X.dtype)
+            x[np.ix_(row_order, col_order)] = _read_coalesced(
+                adat.X, rows[row_order], cols[col_order]
+            )
+        return ad.AnnData(x, obs=adat.obs.iloc[rows], var=adat.var.iloc[cols])
+
+    def get_dtype(self, meas_ids):
+        """
+        Returns the dtype read_measurements returns for measurements
+        """
+        return self.adat.X.dtype
+
+    @property
+    def memmap(self):
+        """
+        X of the current version as a read only numpy.memmap,
+        None if X is compressed or chunked, see get_memmap.
+        """
+        adat = self.adat
+        filename, x_mm = self._memmap
+        if filename != self._adat_filename:
+            x_mm = get_memmap(adat.X)
+            self._memmap = (self._adat_filename, x_mm)
+        return x_mm
+
+    def add_measurements(
+        self, obj_ids, meas_ids, values, replace=True, drop_all_old=True
+    ):
+        """
+        Adds measurements, writing a new version of the anndata file.
+
+        The current version is streamed into the new one block by block,
+        thus besides values only the old values of replaced measurements,
+        which are kept as backup, are held in memory.
+
+        Args:
+            obj_ids: the object ids of the rows of values
+            meas_ids: the measurement ids of the columns of values
+            values: an array of shape (len(obj_ids), len(meas_ids))
+            replace: should existing measurements be updates?
+            drop_all_old: should existing measurements be completly droped
+                          before updating?
+
+        Returns:
+            the new version of the anndata, backed
+        """
+        values = pd.DataFrame(
+            np.asarray(values),
+            index=as_ids(obj_ids).astype(str),
+            columns=as_ids(meas_ids).astype(str),
+        )
+        adat = self.adat
+        base = self._adat_generation
+        # Check that no new objects were added
+        if len(get_difference(values.index, adat.obs.index)) != 0:
+            raise ValueError(
+                "The new data contains new objects, which is not supported yet."
+            )
+
+        old_vars = get_overlap(adat.var.index, values.columns)
+        if len(old_vars) > 0:
+            if not replace:
+                raise ValueError(
+                    f"Measurements {old_vars} already existing"
+                    f" but replace=False was set!.\n"
+                    f"Set replace=True to update values."
+                )
+            if (not drop_all_old) and (adat.shape[0] != values.shape[0]):
+                raise ValueError(
+                    "Updating of existing variables only allowed"
+                    " if values for all observations"
+                    " are provided  or 'drop_all_old=True'"
+                )
+        delta = io_backups.Delta(
+            var_ids_added=as_ids(get_difference(values.columns, old_vars)),
+            values=_get_values(adat, old_vars),
+        )
+        kvars = [i for i in adat.var.index if i not in old_vars]
+        self._rewrite(adat, kvars + list(values.columns), base, delta, values)
+        return self.adat
+
+    def delete_measurements(self, meas_ids):
+        """
+        Deletes measurements, writing a new version of the anndata file.
+
+        Only the values of the deleted measurements are kept as backup.
+
+        Args:
+            meas_ids: the measurement ids to be deleted
+        """
+        meas_ids = set(as_ids(meas_ids).astype(str))
+        adat = self.adat
+        base = self._adat_generation
+        delta = io_backups.Delta(
+            values=_get_values(adat, get_overlap(adat.var.index, meas_ids))
+        )
+        self._rewrite(
+            adat, [i for i in adat.var.index if i not in meas_ids], base, delta
+        )
+
+    def restore_measurements(self, generation):
+        """
+        Restores a previous generation of the anndata file,
+        published as a new version.
+
+        Args:
+            generation: the generation to restore,
+                see backups.get_backups()
+        """
+        versions = self.versions
+        manifest = versions.get_current()
+        data = self.backups.restore(generation)
+        delta = io_backups.Delta.from_frames(
+            io_backups.read_anndata_frame(
+                versions.filename.with_name(manifest[io_versions.FILENAME])
+            ),
+            data,
+        )
+        data = data.rename(index=str, columns=str)
+        with self.writer(
+            self.filename,
+            pd.DataFrame(index=data.columns),
+            delta=delta,
+            retention=self.retention,
+            base=manifest[io_versions.GENERATION],
+            **self.layout,
+        ) as writer:
+            writer.append(data)
+
+    def _rewrite(self, adat, var_names, base, delta=None, values=None):
+        """
+        Publishes a new version of the anndata file, the old version is
+        kept as backup.
+
+        The rows of adat are copied block by block,
+        such that only one block needs to be kept in memory.
+
+        Args:
+            adat: the current version, backed
+            var_names: the measurements of the new version, the ones
+                not in values are copied from adat
+            base: the generation of adat,
+                publishing fails if it is not the current one anymore
+            delta: the io_backups.Delta from the current version,
+                None to back up the whole current version
+            values: a dataframe with the obs names as index and the new
+                measurements as columns, objects missing are set to NaN
+        """
+        var_names = pd.Index(sorted(var_names, key=int))
+        if values is None:
+            values = pd.DataFrame(index=pd.Index([], dtype=str))
+        cols = np.sort(adat.var.index.get_indexer(var_names.difference(values.columns)))
+        # order the objects by id, such that id ranges are contiguous
+        ordobs = np.argsort(as_ids(adat.obs.index), kind="stable")
+        with self.writer(
+            self.filename,
+            adat.var.reindex(var_names),
+            delta=delta,
+            retention=self.retention,
+            base=base,
+            **self.layout,
+        ) as writer:
+            for start in range(0, len(ordobs), BLOCK_ROWS):
+                block = ordobs[start : (start + BLOCK_ROWS)]
+                order = np.argsort(block)
+                rows = block[order]
+                data = pd.DataFrame(
+                    _read_coalesced(adat.X, rows, cols),
+                    index=adat.obs.index[rows],
+                    columns=adat.var.index[cols],
+                ).iloc[np.argsort(order)]
+                writer.append(pd.concat([data, values.reindex(data.index)], axis=1))
+
 
 class IoObjMeasurements:
     def __init__(self, bro):
         self.bro = bro
         self._anndatadict = dict()
         self.scale_anndata = scale_anndata
+        self.convert_anndata_longform = convert_anndata_longform
+        self.iter_anndata_longform = iter_anndata_longform
+
+    def get_ioanndata(self, obj_type):
+        ioan = self._anndatadict.get(obj_type, None)
+        if ioan is None:
+            ioan = get_measurement_store(self.bro, obj_type)
+            self._anndatadict[obj_type] = ioan
+        return ioan
 
     def get_anndata(self, obj_type):
-        anndat = self._anndatadict.get(obj_type, None)
-        if anndat is None:
-            anndat = IoAnnData(self.bro, obj_type)
-            self._anndatadict[obj_type] = anndat
-        return anndat.adat
+        return self.get_ioanndata(obj_type).adat
 
     def get_measurements(
         self,
@@ -92,7 +1095,22 @@ class IoObjMeasurements:
         object_type=None,
         q_meas=None,
         q_obj=None,
+        scale=False,
     ):
+        """
+        Reads the measurements of objects
+
+        Args:
+            dat_obj, objidx: the objects, as a table or as ids of
+                one object_type
+            dat_meas, measidx: the measurements, as a table or as ids
+            q_obj, q_meas: queries for the object and measurement tables
+            scale: scale the measurements by the scale of their
+                reference stacks, requires dat_meas/q_meas to contain it.
+
+        Returns:
+            an anndata with the objects as obs and the measurements as var
+        """
         if q_meas is not None:
             dat_meas = self.bro.doquery(q_meas)
         if q_obj is not None:
@@ -100,54 +1118,46 @@ class IoObjMeasurements:
 
         if dat_meas is not None:
             dat_meas = dat_meas.sort_values(db.measurements.measurement_id.key)
-            measids = list(map(str, dat_meas[db.measurements.measurement_id.key]))
-            dat_meas.index = measids
+            measids = dat_meas[db.measurements.measurement_id.key].values
+            dat_meas.index = measids.astype(str)
         else:
-            measids = set(map(str, sorted(measidx)))
+            measids = as_ids(measidx)
 
         if dat_obj is not None:
-            obsidx = list(map(str, dat_obj[db.objects.object_id.key]))
-            dat_obj.index = obsidx
-            dat_obj.index.name = None
             dat_obj = dat_obj.sort_values(db.objects.object_id.key)
-            it = dat_obj.groupby(db.objects.object_type.key)
+            dat_obj.index = dat_obj[db.objects.object_id.key].values.astype(str)
+            it = (
+                (objtype, grp[db.objects.object_id.key].values)
+                for objtype, grp in dat_obj.groupby(db.objects.object_type.key)
+            )
         else:
+            it = [(object_type, objidx)]
 
-            class obs:
-                index = list(map(str, sorted(objidx)))
-
-            it = [(object_type, obs)]
-
-        dats = []
-        for objtype, grp in it:
-            obsidx = grp.index
-            adat = self.get_anndata(objtype)
-            varidx = list(set(measids).intersection(adat.var.index))
-            if (len(varidx) > 0) & (len(obsidx) > 0):
-                adat = adat[:, sorted(varidx, key=int)]
-                dats.append(
-                    ad.AnnData(adat.X, obs=adat.obs, var=adat.var)[obsidx, :].copy()
-                )
-        if len(dats) == 1:
-            dat = dats[0]
-        elif len(dats) == 0:
+        blocks = []
+        for objtype, objids in it:
+            ioan = self.get_ioanndata(objtype)
+            objids = np.unique(as_ids(objids))
+            varids = np.intersect1d(measids, ioan.position_index.var_ids)
+            if (len(objids) > 0) & (len(varids) > 0):
+                blocks.append((ioan, objids, varids))
+        if len(blocks) == 1:
+            ioan, objids, varids = blocks[0]
+            dat = ioan.read_measurements(objids, varids)
+        elif len(blocks) == 0:
             raise ValueError("No valid measurements found")
         else:
-            dat = ad.AnnData.concatenate(*dats, join="outer", index_unique=None)
+            dat = _read_measurement_blocks(blocks)
         if dat_meas is not None:
             dat.var = dat.var.join(dat_meas)
         if dat_obj is not None:
             dat.obs = dat.obs.join(dat_obj)
+        if scale:
+            scale_anndata(dat)
         return dat
 
     @staticmethod
     def convert_anndata_legacy(adat):
-        d = pd.DataFrame(
-            adat.X, index=adat.obs.object_id, columns=adat.var.measurement_id
-        ).stack()
-        d.name = db.object_measurements.value.key
-        dat = d.reset_index().merge(adat.obs.reset_index(drop=True)).merge(adat.var)
-        return dat
+        return convert_anndata_longform(adat, categorical=False)
 
     def add_anndata_datmeasurements(self, dat_new, replace=True, drop_all_old=False):
         for obj_type, dat in dat_new.groupby(db.objects.object_type.key):
@@ -172,54 +1182,248 @@ class IoObjMeasurements:
             drop_all_old: should existing measurements be completly droped
                           before updating?
 
+        """
+        self.add_objectmeasurements(
+            obj_type,
+            np.asarray(adat_new.X),
+            adat_new.obs.index,
+            adat_new.var.index,
+            replace=replace,
+            drop_all_old=drop_all_old,
+        )
+
+    def add_objectmeasurements(
+        self, obj_type, values, obj_ids, meas_ids, replace=True, drop_all_old=True
+    ):
+        """
+        Adds measurements given as a wide array
+        Args:
+            obj_type: the object type
+            values: an array of shape (len(obj_ids), len(meas_ids))
+            obj_ids: the object ids of the rows
+            meas_ids: the measurement ids of the columns
+            replace: should existing measurements be updates?
+            drop_all_old: should existing measurements be completly droped
+                          before updating?
+        """
+        self.get_ioanndata(obj_type).add_measurements(
+            obj_ids, meas_ids, values, replace=replace, drop_all_old=drop_all_old
+        )
+
+    def delete_objectmeasurements(self, obj_type, meas_ids):
+        """
+        Deletes measurements of an object type
+        Args:
+            obj_type: the object type
+            meas_ids: the measurement ids to be deleted
+        """
+        self.get_ioanndata(obj_type).delete_measurements(meas_ids)
+
+    def get_objectmeasurement_backups(self, obj_type):
+        """
+        Returns the backups of the measurements of an object type
+        Args:
+            obj_type: the object type
         Returns:
+            a dataframe with the generations that can be restored
+        """
+        ioan = self.get_ioanndata(obj_type)
+        if not hasattr(ioan, "backups"):
+            raise ValueError("Only the anndata measurement store keeps backups.")
+        return ioan.backups.get_backups()
 
+    def restore_objectmeasurements(self, obj_type, generation):
         """
-        adat = self.get_anndata(obj_type)
-        # Check that no new objects were added
-        if len(get_difference(adat_new.obs.index, adat.obs.index)) != 0:
-            raise ValueError(
-                "The new data contains new objects, which is not supported yet."
-            )
+        Restores a previous generation of the measurements of an object type
+        Args:
+            obj_type: the object type
+            generation: the generation to be restored,
+                see get_objectmeasurement_backups
+        """
+        ioan = self.get_ioanndata(obj_type)
+        if not hasattr(ioan, "restore_measurements"):
+            raise ValueError("Only the anndata measurement store keeps backups.")
+        ioan.restore_measurements(generation)
 
-        old_vars = get_overlap(adat.var.index, adat_new.var.index)
-        if len(old_vars) > 0:
-            if not replace:
-                raise ValueError(
-                    f"Measurements {old_vars} already existing"
-                    f" but replace=False was set!.\n"
-                    f"Set replace=True to update values."
-                )
-            if (not drop_all_old) and (adat.shape[0] != adat_new.shape[0]):
-                raise ValueError(
-                    "Updating of existing variables only allowed"
-                    " if values for all observations"
-                    " are provided  or 'drop_all_old=True'"
-                )
-            else:
-                kvars = [i for i in adat.var.index if i not in old_vars]
-                adat = adat[:, kvars]
 
-        adat = copy_in_memory(adat)
-        adat = adat.T.concatenate(
-            adat_new.T, index_unique=None, batch_key="batch", join="outer"
-        ).T
-        adat.var = adat.var.drop(columns="batch")
+def _append_obs_names(f, obs_names):
+    """
+    Appends observation names to the obs of an open anndata file.
+    """
+    if len(obs_names) == 0:
+        return
+    obs = read_elem(f["obs"])
+    obs_new = pd.DataFrame(
+        index=pd.Index(np.concatenate(obs_names), dtype=str, name=obs.index.name)
+    )
+    obs = pd.concat([obs, obs_new])
+    del f["obs"]
+    write_elem(f, "obs", obs)
 
-        ioan = self._anndatadict[obj_type]
-        ioan.adat.file.close()
 
-        fn_backup = f'{ioan.filename}.{time.strftime("%Y%m%d-%H%M%S")}'
-        shutil.move(str(ioan.filename), fn_backup)
+def get_file_key(filename):
+    """
+    Identifies the version of a file by its size and modification time
+    """
+    st = os.stat(filename)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
 
-        # check order of variables
-        ordvars = sorted(adat.var.index, key=int)
-        if ordvars != list(adat.var.index):
-            adat = adat[:, ordvars]
 
-        adat.write(str(ioan.filename))
-        ioan._adat = None
-        return adat
+def as_ids(ids):
+    """
+    Converts ids given as an array, list or set of ints or strings
+    to an int64 array.
+    """
+    if isinstance(ids, (set, frozenset)):
+        ids = list(ids)
+    return np.asarray(ids).astype(np.int64)
+
+
+def _read_index_ids(elem):
+    """
+    Reads the index of an obs or var element as integer ids
+    """
+    return np.asarray(read_elem(elem).index, dtype=str).astype(np.int64)
+
+
+def _lookup_positions(ids, sorted_ids, order):
+    """
+    Looks up the positions of ids using the sorted ids
+    and the order sorting them.
+
+    Returns:
+        the positions and a mask indicating which ids were found
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    idx = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return order[idx], sorted_ids[idx] == ids
+
+
+def get_ranges(positions, max_gap):
+    """
+    Groups sorted positions into (start, stop) ranges,
+    merging ranges separated by at most max_gap positions.
+    """
+    if len(positions) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(positions) > max_gap + 1)
+    starts = positions[np.r_[0, breaks + 1]]
+    stops = positions[np.r_[breaks, len(positions) - 1]] + 1
+    return list(zip(starts, stops))
+
+
+def _is_range(positions):
+    return (len(positions) > 0) and np.array_equal(
+        positions, np.arange(positions[0], positions[0] + len(positions))
+    )
+
+
+def _take_memmap(x_mm, rows, cols):
+    """
+    Takes rows and columns of a read only memmap as a writable array.
+
+    If both are contiguous ranges, the array is a view of a new copy on
+    write mapping of the file: no values are copied, and writes to it
+    neither change the file nor x_mm. Otherwise the values are copied.
+    """
+    if _is_range(rows) and _is_range(cols):
+        x_cow = np.memmap(
+            x_mm.filename,
+            mode="c",
+            dtype=x_mm.dtype,
+            shape=x_mm.shape,
+            offset=x_mm.offset,
+        )
+        return x_cow[rows[0] : (rows[-1] + 1), cols[0] : (cols[-1] + 1)]
+    return x_mm[np.ix_(rows, cols)]
+
+
+def _read_coalesced(dset, rows, cols):
+    """
+    Reads rows and columns of a 2D dataset as contiguous blocks.
+
+    Args:
+        dset: an h5py dataset
+        rows: sorted, unique row positions
+        cols: sorted, unique column positions
+
+    Returns:
+        an array of shape (len(rows), len(cols))
+    """
+    out = np.empty((len(rows), len(cols)), dtype=dset.dtype)
+    # split the row ranges at multiples of the chunk rows,
+    # such that no chunk needs to be decompressed twice
+    block_rows = BLOCK_ROWS
+    if dset.chunks is not None:
+        block_rows = max(1, BLOCK_ROWS // dset.chunks[0]) * dset.chunks[0]
+    row_ranges = []
+    for r0, r1 in get_ranges(rows, MAX_ROW_GAP):
+        bounds = np.r_[
+            r0, np.arange((r0 // block_rows + 1) * block_rows, r1, block_rows), r1
+        ]
+        row_ranges.extend(zip(bounds[:-1], bounds[1:]))
+    col_ranges = get_ranges(cols, MAX_COL_GAP)
+    for r0, r1 in row_ranges:
+        ri = slice(np.searchsorted(rows, r0), np.searchsorted(rows, r1))
+        if ri.start == ri.stop:
+            continue
+        for c0, c1 in col_ranges:
+            ci = slice(np.searchsorted(cols, c0), np.searchsorted(cols, c1))
+            block = dset[r0:r1, c0:c1]
+            out[ri, ci] = block[np.ix_(rows[ri] - r0, cols[ci] - c0)]
+    return out
+
+
+def _read_measurement_blocks(blocks):
+    """
+    Reads the measurements of several object types into one anndata.
+
+    The output is allocated once, filled with NaN for measurements
+    missing for an object type, and every object type fills its block
+    of rows. The object types are read in parallel, as they are
+    stored in separate files.
+
+    Args:
+        blocks: a list of (store, object ids, measurement ids), the ids
+            sorted and present in the store
+
+    Returns:
+        an anndata with the objects in the order of the blocks as obs and
+        the union of the measurements, sorted by id, as var.
+        obs.batch is the index of the block, as by AnnData.concatenate.
+    """
+    var_ids = np.unique(np.concatenate([varids for _, _, varids in blocks]))
+    offsets = np.cumsum([0] + [len(objids) for _, objids, _ in blocks])
+    dtype = np.result_type(*[ioan.get_dtype(varids) for ioan, _, varids in blocks])
+    x = np.full((offsets[-1], len(var_ids)), np.nan, dtype=dtype)
+
+    def read_block(i):
+        ioan, objids, varids = blocks[i]
+        dat = ioan.read_measurements(objids, varids)
+        x[offsets[i] : offsets[i + 1], np.searchsorted(var_ids, varids)] = dat.X
+        return dat.obs
+
+    with concurrent.futures.ThreadPoolExecutor(len(blocks)) as pool:
+        obs = pd.concat(list(pool.map(read_block, range(len(blocks)))))
+    obs["batch"] = pd.Categorical(
+        np.repeat(np.arange(len(blocks)).astype(str), np.diff(offsets))
+    )
+    var = pd.DataFrame(index=pd.Index(var_ids.astype(str)))
+    return ad.AnnData(x, obs=obs, var=var)
+
+
+def _get_values(adat, var_names):
+    """
+    Reads the values of measurements of a backed anndata as a dataframe
+    """
+    cols = np.sort(adat.var.index.get_indexer(list(var_names)))
+    return pd.DataFrame(
+        _read_coalesced(adat.X, np.arange(adat.shape[0]), cols),
+        index=adat.obs.index,
+        columns=adat.var.index[cols],
+    )
 
 
 def get_overlap(a, b):
@@ -0,0 +1,380 @@
+"""
+Space bounded backups of the versioned measurement files.
+
+Instead of keeping every previous version, only the changes to it are kept
+as a delta: the old values of the columns that were replaced or dropped and
+the ids of the rows and columns that were added. Previous generations are
+restored by applying the deltas backwards, starting from the current
+version. Replaced versions are removed by prune once their grace period
+is over, such that readers that just followed the pointer to them can
+still open them. Until then they count against the retention.
+"""
+import logging
+import os
+import pathlib
+import re
+import shutil
+
+import anndata as ad
+import h5py
+import numpy as np
+import pandas as pd
+
+import spherpro.bromodules.io_versions as io_versions
+import spherpro.configuration as config
+
+SUFFIX_BACKUPS = ".backups"
+SUFFIX_DELTA = ".delta.h5"
+OBS_IDS_ADDED = "obs_ids_added"
+VAR_IDS_ADDED = "var_ids_added"
+OBS_IDS = "obs_ids"
+VAR_IDS = "var_ids"
+X = "X"
+
+KIND_DELTA = "delta"
+KIND_FULL = "full"
+
+COL_GENERATION = "generation"
+COL_PARENT = "parent"
+COL_KIND = "kind"
+COL_FILENAME = "filename"
+COL_BYTES = "bytes"
+
+
+def get_backup_retention(conf):
+    """
+    Returns the configured retention of the backups
+    as accepted by MeasurementBackups.prune.
+    """
+    retention = conf[config.MEASUREMENT_BACKUP]
+    return {
+        "max_bytes": retention[config.MAX_BYTES],
+        "max_generations": retention[config.MAX_GENERATIONS],
+        "grace_period": retention[config.GRACE_PERIOD],
+    }
+
+
+def _get_size(filenames):
+    """
+    Returns the total size of the existing files,
+    counting files hard linked to each other once
+    """
+    stats = dict()
+    for fn in filenames:
+        try:
+            st = os.stat(fn)
+        except FileNotFoundError:
+            continue
+        stats[(st.st_dev, st.st_ino)] = st.st_size
+    return sum(stats.values())
+
+
+def _as_int_ids(ids):
+    return np.asarray(ids).astype(np.int64)
+
+
+def read_anndata_frame(filename, exclude_var_ids=()):
+    """
+    Reads a measurement file as a dataframe with integer ids
+
+    Args:
+        filename: the anndata file
+        exclude_var_ids: ids of measurements not to be read
+    """
+    adat = ad.read_h5ad(filename, backed="r")
+    try:
+        var_ids = _as_int_ids(adat.var.index)
+        cols = np.flatnonzero(~np.isin(var_ids, _as_int_ids(exclude_var_ids)))
+        if len(cols) == len(var_ids):
+            x = adat.X[:]
+        elif len(cols) == 0:
+            x = np.empty((adat.shape[0], 0), dtype=adat.X.dtype)
+        else:
+            x = adat.X[:, cols]
+        return pd.DataFrame(
+            np.asarray(x), index=_as_int_ids(adat.obs.index), columns=var_ids[cols]
+        )
+    finally:
+        adat.file.close()
+
+
+class Delta:
+    """
+    The changes from a parent generation to a child generation.
+    """
+
+    def __init__(self, obs_ids_added=(), var_ids_added=(), values=None):
+        """
+        Args:
+            obs_ids_added: the ids of the objects added
+            var_ids_added: the ids of the measurements added
+            values: a dataframe with the parent values of the replaced
+                or dropped measurements, the object ids as index and the
+                measurement ids as columns
+        """
+        self.obs_ids_added = _as_int_ids(obs_ids_added)
+        self.var_ids_added = _as_int_ids(var_ids_added)
+        if values is None:
+            values = pd.DataFrame(index=np.array([], dtype=np.int64))
+        self.values = values.set_axis(_as_int_ids(values.index), axis=0).set_axis(
+            _as_int_ids(values.columns), axis=1
+        )
+
+    @classmethod
+    def from_frames(cls, data_parent, data_child):
+        """
+        Computes the delta between two generations given as dataframes
+        with integer ids.
+        """
+        obs_added = data_child.index.difference(data_parent.index)
+        var_added = data_child.columns.difference(data_parent.columns)
+        if len(data_parent.index.difference(data_child.index)) > 0:
+            # objects were removed: keep all values of the parent
+            return cls(obs_added, var_added, data_parent)
+        common = data_child.reindex(
+            index=data_parent.index, columns=data_parent.columns
+        )
+        changed = [
+            col
+            for col in data_parent.columns
+            if not np.array_equal(
+                data_parent[col].values, common[col].values, equal_nan=True
+            )
+        ]
+        return cls(obs_added, var_added, data_parent[changed])
+
+    def revert(self, data):
+        """
+        Returns the parent generation of a child generation
+
+        Args:
+            data: the child generation as a dataframe with integer ids
+        """
+        values = self.values
+        data = data.drop(
+            index=self.obs_ids_added,
+            columns=np.union1d(self.var_ids_added, values.columns),
+            errors="ignore",
+        )
+        data = data.reindex(
+            index=data.index.append(values.index.difference(data.index))
+        )
+        data = pd.concat([data, values.reindex(index=data.index)], axis=1)
+        return data.reindex(columns=sorted(data.columns))
+
+    def write(self, filename):
+        with h5py.File(filename, "w") as f:
+            f.create_dataset(OBS_IDS_ADDED, data=self.obs_ids_added)
+            f.create_dataset(VAR_IDS_ADDED, data=self.var_ids_added)
+            f.create_dataset(OBS_IDS, data=_as_int_ids(self.values.index))
+            f.create_dataset(VAR_IDS, data=_as_int_ids(self.values.columns))
+            f.create_dataset(X, data=self.values.to_numpy())
+
+    @classmethod
+    def read(cls, filename):
+        with h5py.File(filename, "r") as f:
+            values = pd.DataFrame(f[X][:], index=f[OBS_IDS][:], columns=f[VAR_IDS][:])
+            return cls(f[OBS_IDS_ADDED][:], f[VAR_IDS_ADDED][:], values)
+
+
+class MeasurementBackups:
+    """
+    The backups of the previous generations of a versioned measurement file.
+
+    The backup reverting generation 4 to its parent 3 of e.g. cell.h5ad is
+    stored as cell.h5ad.backups/000004-000003.delta.h5. If no delta is known,
+    e.g. after a reimport, the whole parent is kept as 000004-000003.h5ad.
+    """
+
+    def __init__(self, versions):
+        """
+        Args:
+            versions: the io_versions.FileVersions of the measurement file
+        """
+        self.versions = versions
+        filename = versions.filename
+        self.dirname = pathlib.Path(str(filename) + SUFFIX_BACKUPS)
+        self._pattern = re.compile(
+            r"^(\d+)-(\d+)("
+            + re.escape(SUFFIX_DELTA)
+            + "|"
+            + re.escape(filename.suffix)
+            + ")$"
+        )
+
+    def get_backups(self):
+        """
+        Returns the backups as a dataframe sorted by generation
+        """
+        rows = []
+        if self.dirname.exists():
+            for fn in self.dirname.iterdir():
+                m = self._pattern.match(fn.name)
+                if m is None:
+                    continue
+                rows.append(
+                    {
+                        COL_GENERATION: int(m.group(1)),
+                        COL_PARENT: int(m.group(2)),
+                        COL_KIND: KIND_DELTA
+                        if m.group(3) == SUFFIX_DELTA
+                        else KIND_FULL,
+                        COL_FILENAME: fn,
+                        COL_BYTES: fn.stat().st_size,
+                    }
+                )
+        return pd.DataFrame(
+            rows,
+            columns=[COL_GENERATION, COL_PARENT, COL_KIND, COL_FILENAME, COL_BYTES],
+        ).sort_values(COL_GENERATION, ignore_index=True)
+
+    def _get_backup_filename(self, generation, parent, suffix):
+        return self.dirname / f"{generation:06d}-{parent:06d}{suffix}"
+
+    def publish(
+        self,
+        generation,
+        base,
+        delta=None,
+        max_bytes=None,
+        max_generations=None,
+        grace_period=0,
+    ):
+        """
+        Publishes a written generation and replaces its parent by a backup.
+
+        Args:
+            generation: the generation written
+            base: the generation it was written on top of,
+                see io_versions.FileVersions.publish
+            delta: the Delta from the parent to the generation,
+                None to keep the whole parent
+            max_bytes, max_generations, grace_period: the retention,
+                see prune
+
+        Returns:
+            the manifest of the published generation
+        """
+        manifest = self.versions.publish(generation, base)
+        parent = manifest[io_versions.PARENT]
+        if parent is not None:
+            self._backup(generation, parent, delta)
+        self.prune(
+            max_bytes=max_bytes,
+            max_generations=max_generations,
+            grace_period=grace_period,
+        )
+        return manifest
+
+    def _backup(self, generation, parent, delta):
+        fn_parent = self.versions.get_version_filename(parent)
+        if not fn_parent.exists():
+            logging.debug(f"No backup of {fn_parent}, the file does not exist.")
+            return
+        self.dirname.mkdir(exist_ok=True)
+        if delta is None:
+            fn = self._get_backup_filename(generation, parent, fn_parent.suffix)
+            fn_tmp = fn.with_name(fn.name + ".tmp")
+            try:
+                os.link(fn_parent, fn_tmp)
+            except OSError:  # no hard links on this file system
+                shutil.copyfile(fn_parent, fn_tmp)
+        else:
+            fn = self._get_backup_filename(generation, parent, SUFFIX_DELTA)
+            fn_tmp = fn.with_name(fn.name + ".tmp")
+            delta.write(fn_tmp)
+        os.replace(fn_tmp, fn)
+        # removed by prune after the grace period
+        self.versions.retire(parent)
+
+    def prune(self, max_bytes=None, max_generations=None, grace_period=0):
+        """
+        Removes the replaced versions retired longer than the grace period
+        and the oldest generations kept exceeding the retention.
+
+        A replaced version still in its grace period is a full copy of its
+        generation, thus it counts against the retention like a backup
+        and is removed early if the retention is exceeded.
+
+        Args:
+            max_bytes: the maximal total size of the backups and replaced
+                versions, None: no limit
+            max_generations: the maximal number of generations kept,
+                None: no limit
+            grace_period: seconds a replaced version is kept for readers
+        """
+        self.versions.remove_retired(grace_period)
+        backups = self.get_backups()
+        # the backup files by the generation they keep
+        backup_files = dict()
+        for parent, fn in zip(backups[COL_PARENT], backups[COL_FILENAME]):
+            backup_files.setdefault(parent, []).append(fn)
+        retired = set(self.versions.get_retired())
+        kept = sorted(retired.union(backup_files))
+        sizes = dict()
+        for generation in kept:
+            fns = list(backup_files.get(generation, []))
+            if generation in retired:
+                fns += self.versions.get_filenames(generation)
+            sizes[generation] = _get_size(fns)
+        nbytes = sum(sizes.values())
+        ngenerations = len(kept)
+        for generation in kept:
+            if ((max_bytes is None) or (nbytes <= max_bytes)) and (
+                (max_generations is None) or (ngenerations <= max_generations)
+            ):
+                break
+            for fn in backup_files.get(generation, []):
+                os.remove(fn)
+            if generation in retired:
+                self.versions.try_remove(generation)
+            nbytes -= sizes[generation]
+            ngenerations -= 1
+
+    def restore(self, generation):
+        """
+        Rebuilds a previous generation
+
+        Only the measurements not replaced on the way back are read from
+        the newer version, thus the memory needed is about the size of
+        the restored generation plus the values kept in the deltas.
+
+        Args:
+            generation: the generation to be restored
+
+        Returns:
+            the generation as a dataframe with the object ids as index
+            and the measurement ids as columns
+        """
+        fn = self.versions.get_version_filename(generation)
+        if fn.exists():
+            return read_anndata_frame(fn)
+        backups = self.get_backups().set_index(COL_GENERATION)
+        current = self.versions.get_current()
+        if current is None:
+            raise ValueError(f"{self.versions.filename} was not written yet.")
+        gen = current[io_versions.GENERATION]
+        fn_start = self.versions.filename.with_name(current[io_versions.FILENAME])
+        deltas = []
+        while gen != generation:
+            if gen not in backups.index:
+                raise ValueError(
+                    f"Generation {generation} can not be restored,"
+                    f" no backup of the parent of generation {gen}."
+                )
+            backup = backups.loc[gen]
+            if backup[COL_KIND] == KIND_FULL:
+                # the newer deltas are not needed
+                fn_start = backup[COL_FILENAME]
+                deltas = []
+            else:
+                deltas.append(backup[COL_FILENAME])
+            gen = backup[COL_PARENT]
+        deltas = [Delta.read(fn) for fn in deltas]
+        replaced = [np.union1d(d.var_ids_added, d.values.columns) for d in deltas]
+        data = read_anndata_frame(
+            fn_start, exclude_var_ids=np.unique(np.concatenate([[]] + replaced))
+        )
+        for delta in deltas:
+            data = delta.revert(data)
+        return data
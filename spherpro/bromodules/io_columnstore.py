@@ -0,0 +1,426 @@
+"""
+A column store as a backend for the object measurements.
+
+Every measurement is stored as a separate HDF5 dataset, thus adding,
+replacing or deleting a measurement only touches the affected column
+and not the whole matrix.
+
+Rows are appended behind a commit marker, the N_ROWS attribute of the
+store: readers only use the rows below it, thus rows of an interrupted
+append are never read. Readers in other processes only profit from this
+with the zarr store, see io_zarrstore. The HDF5 file is not opened in
+SWMR mode, which forbids writing attributes and creating columns, thus
+the HDF5 store requires a single writer and no concurrent readers.
+"""
+import os
+import pathlib
+
+import anndata as ad
+import h5py
+import numpy as np
+import pandas as pd
+
+import spherpro.bromodules.io_anndata as io_anndata
+import spherpro.bromodules.io_base as io_base
+import spherpro.db as db
+
+SUFFIX_COLUMNSTORE = ".columns.h5"
+OBS_IDS = "obs_ids"
+COLUMNS = "columns"
+# attribute with the number of committed rows
+N_ROWS = "n_rows"
+# rows per chunk of the column datasets
+CHUNK_ROWS = 2 ** 14
+
+
+def get_columnstore_filename(conf: object, object_type: str):
+    fn = pathlib.Path(conf["sqlite"]["db"]).parent / (object_type + SUFFIX_COLUMNSTORE)
+    return fn
+
+
+class Hdf5Columns:
+    """
+    The storage primitives of the column store, one HDF5 file
+    with a dataset per column.
+
+    Not safe for readers in other processes while a process writes:
+    with HDF5 file locking they fail to open the file, without it they
+    may see a torn file.
+    """
+
+    @staticmethod
+    def create(filename):
+        """
+        Creates an empty column store.
+
+        The free space of deleted columns is tracked persistently,
+        such that it is reused by later writes.
+        """
+        f = h5py.File(filename, "w", fs_strategy="fsm", fs_persist=True)
+        f.create_dataset(
+            OBS_IDS,
+            shape=(0,),
+            maxshape=(None,),
+            dtype=np.int64,
+            chunks=(CHUNK_ROWS,),
+        )
+        f.create_group(COLUMNS)
+        f.attrs[N_ROWS] = 0
+        return f
+
+    @staticmethod
+    def open(filename, mode="r"):
+        return h5py.File(filename, mode)
+
+    @staticmethod
+    def close(f):
+        f.close()
+
+    @staticmethod
+    def create_column(
+        f,
+        name,
+        dtype=np.float64,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        chunk_rows=None,
+        chunk_cols=None,
+        contiguous=False,
+    ):
+        """
+        Creates a column for all current rows, filled with NaN.
+
+        The remaining arguments define the storage layout,
+        see io_anndata.get_storage_layout. chunk_cols and contiguous
+        are ignored, the columns need to be resizable.
+        """
+        return f[COLUMNS].create_dataset(
+            name,
+            shape=f[OBS_IDS].shape,
+            maxshape=(None,),
+            dtype=dtype,
+            chunks=(chunk_rows or CHUNK_ROWS,),
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+            fillvalue=np.nan,
+        )
+
+    @classmethod
+    def write_column(cls, f, name, column, **layout):
+        """
+        Writes all values of a column, the column is created if needed.
+        """
+        if name not in f[COLUMNS]:
+            cls.create_column(f, name, **layout)
+        f[COLUMNS][name][: len(column)] = column
+
+    @staticmethod
+    def delete_column(f, name):
+        del f[COLUMNS][name]
+
+    @staticmethod
+    def get_key(filename):
+        """
+        Returns a key changing whenever the store is modified
+        """
+        return io_anndata.get_file_key(filename)
+
+
+def get_n_rows(f):
+    """
+    Returns the number of committed rows of an open store.
+
+    Stores written without the commit marker have all rows committed.
+    """
+    return int(f.attrs.get(N_ROWS, f[OBS_IDS].shape[0]))
+
+
+def _append_rows(store_format, f, data, **layout):
+    """
+    Appends rows to an open column store.
+
+    Columns not yet present are created, missing values are NaN.
+    The rows are committed by updating N_ROWS after all values are
+    written, rows left uncommitted by an interrupted append are
+    overwritten. Concurrent readers only see committed rows if the store
+    format supports them, i.e. the zarr store.
+
+    Args:
+        store_format: the storage primitives of the store, e.g. Hdf5Columns
+        f: the open store
+        data: a dataframe with the object ids as index and the
+            measurement ids as columns
+        layout: the storage layout of new columns
+    """
+    data = data.rename(columns=str)
+    cols = f[COLUMNS]
+    for name in data.columns:
+        if name not in cols:
+            store_format.create_column(f, name, **layout)
+    obs = f[OBS_IDS]
+    nstart = get_n_rows(f)
+    nrow = data.shape[0]
+    obs.resize((nstart + nrow,))
+    obs[nstart:] = io_anndata.as_ids(data.index)
+    for name in cols.keys():
+        cols[name].resize((nstart + nrow,))
+    values = np.asfortranarray(data.to_numpy(dtype=layout.get("dtype", np.float64)))
+    for i, name in enumerate(data.columns):
+        cols[name][nstart:] = values[:, i]
+    f.attrs[N_ROWS] = nstart + nrow
+
+
+def _read_rows(dset, rows):
+    """
+    Reads sorted rows of a column as coalesced ranges.
+    """
+    out = np.empty(len(rows), dtype=dset.dtype)
+    for r0, r1 in io_anndata.get_ranges(rows, io_anndata.MAX_ROW_GAP):
+        ri = slice(np.searchsorted(rows, r0), np.searchsorted(rows, r1))
+        out[ri] = dset[r0:r1][rows[ri] - r0]
+    return out
+
+
+class ColumnStoreWriter:
+    """
+    Writes a column store chunk by chunk.
+    """
+
+    store_format = Hdf5Columns
+
+    def __init__(self, filename, var, dtype=np.float64, **layout):
+        """
+        Args:
+            filename: the store file to be written
+            var: the var dataframe, indexed by the measurement ids
+            dtype: the dtype of the columns
+            layout: the storage layout of the columns,
+                see io_anndata.get_storage_layout
+        """
+        self.filename = filename
+        self.layout = dict(layout, dtype=dtype)
+        self._file = self.store_format.create(filename)
+        for name in var.index:
+            self.store_format.create_column(self._file, str(name), **self.layout)
+
+    def append(self, data):
+        """
+        Appends a chunk of observations
+        Args:
+            data: a dataframe with the obs names as index and the var
+                names as columns
+        """
+        _append_rows(self.store_format, self._file, data, **self.layout)
+
+    def close(self):
+        self.store_format.close(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class IoColumnStore(io_base.BaseIo):
+    """
+    Stores the measurements of an object type with one
+    dataset per measurement.
+
+    Provides the same interface as IoAnnData.
+    """
+
+    writer = ColumnStoreWriter
+    store_format = Hdf5Columns
+    get_filename = staticmethod(get_columnstore_filename)
+    get_layout = staticmethod(io_anndata.get_storage_layout)
+
+    def __init__(self, bro, obj_type):
+        super().__init__(bro)
+        self.obj_type = obj_type
+        self._position_index = None
+
+    @property
+    def filename(self):
+        """
+        Filename of the column store
+        """
+        return self.get_filename(self.bro.data.conf, self.obj_type)
+
+    @classmethod
+    def get_writer(cls, conf, obj_type, var):
+        """
+        Returns a chunk writer initializing the store
+        """
+        return cls.writer(cls.get_filename(conf, obj_type), var, **cls.get_layout(conf))
+
+    @property
+    def layout(self):
+        """
+        The configured storage layout
+        """
+        return self.get_layout(self.bro.data.conf)
+
+    def initialize_anndata(self, data, var=None, obs=None):
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame(data, index=obs.index, columns=var.index)
+        with self.writer(
+            self.filename, pd.DataFrame(index=data.columns), **self.layout
+        ) as writer:
+            writer.append(data)
+
+    def initialize_anndata_chunked(self, chunks, var):
+        """
+        Initializes the store from an iterable of chunks.
+
+        Args:
+            chunks: an iterable of dataframes with the object ids as index
+                and the measurement ids as columns
+            var: the var dataframe, indexed by the measurement ids
+        """
+        with self.writer(self.filename, var, **self.layout) as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+
+    def append_anndata_chunked(self, chunks):
+        """
+        Appends observations to the store from an iterable of chunks.
+
+        Args:
+            chunks: an iterable of dataframes with the object ids as index
+                and the measurement ids as columns
+        """
+        if not os.path.exists(self.filename):
+            with self.store_format.create(self.filename):
+                pass
+        layout = self.layout
+        with self.store_format.open(self.filename, "r+") as f:
+            for chunk in chunks:
+                _append_rows(self.store_format, f, chunk, **layout)
+
+    @property
+    def position_index(self):
+        """
+        The PositionIndex of the store
+        """
+        posidx = self._position_index
+        key = self.store_format.get_key(self.filename)
+        if (posidx is None) or (not np.array_equal(posidx.key, key)):
+            with self.store_format.open(self.filename, "r") as f:
+                self._position_index = io_anndata.PositionIndex(
+                    f[OBS_IDS][: get_n_rows(f)], list(f[COLUMNS].keys()), key=key
+                )
+        return self._position_index
+
+    @property
+    def adat(self):
+        """
+        The whole store as an in memory anndata
+        """
+        posidx = self.position_index
+        return self.read_measurements(posidx.obs_ids, posidx.var_ids)
+
+    def read_measurements(self, obj_ids, meas_ids):
+        """
+        Reads the values of objects and measurements.
+
+        Args:
+            obj_ids: object ids, all need to be present in the store
+            meas_ids: measurement ids, ids not present in the store
+                are ignored
+
+        Returns:
+            an anndata with the objects as obs and the measurements as
+            var, both sorted by id.
+        """
+        posidx = self.position_index
+        obj_ids = np.unique(io_anndata.as_ids(obj_ids))
+        meas_ids = np.unique(io_anndata.as_ids(meas_ids))
+        rows, found = posidx.get_obs_positions(obj_ids)
+        if not found.all():
+            raise KeyError(
+                f"Objects {obj_ids[~found][:10]} not found in {self.filename}"
+            )
+        meas_ids = meas_ids[np.isin(meas_ids, posidx.var_ids)]
+        row_order = np.argsort(rows)
+        with self.store_format.open(self.filename, "r") as f:
+            cols = f[COLUMNS]
+            names = meas_ids.astype(str)
+            dtype = np.result_type(np.float32, *[cols[name].dtype for name in names])
+            x = np.empty((len(rows), len(meas_ids)), dtype=dtype)
+            for i, name in enumerate(names):
+                x[row_order, i] = _read_rows(cols[name], rows[row_order])
+        obs = pd.DataFrame(
+            index=pd.Index(obj_ids.astype(str), name=db.objects.object_id.key)
+        )
+        var = pd.DataFrame(index=pd.Index(meas_ids.astype(str)))
+        return ad.AnnData(x, obs=obs, var=var)
+
+    def get_dtype(self, meas_ids):
+        """
+        Returns the dtype read_measurements returns for measurements
+        """
+        names = np.intersect1d(
+            io_anndata.as_ids(meas_ids), self.position_index.var_ids
+        ).astype(str)
+        with self.store_format.open(self.filename, "r") as f:
+            cols = f[COLUMNS]
+            return np.result_type(np.float32, *[cols[name].dtype for name in names])
+
+    def add_measurements(
+        self, obj_ids, meas_ids, values, replace=True, drop_all_old=True
+    ):
+        """
+        Adds measurements, only the columns of the measurements are written.
+
+        Args:
+            obj_ids: the object ids of the rows of values
+            meas_ids: the measurement ids of the columns of values
+            values: an array of shape (len(obj_ids), len(meas_ids))
+            replace: should existing measurements be updates?
+            drop_all_old: should existing measurements be completly droped
+                          before updating? Else values for all objects
+                          need to be provided.
+        """
+        posidx = self.position_index
+        values = np.asarray(values, dtype=np.float64)
+        meas_ids = io_anndata.as_ids(meas_ids)
+        rows, found = posidx.get_obs_positions(io_anndata.as_ids(obj_ids))
+        if not found.all():
+            raise ValueError(
+                "The new data contains new objects, which is not supported yet."
+            )
+        old_vars = meas_ids[np.isin(meas_ids, posidx.var_ids)]
+        if len(old_vars) > 0:
+            if not replace:
+                raise ValueError(
+                    f"Measurements {set(old_vars)} already existing"
+                    f" but replace=False was set!.\n"
+                    f"Set replace=True to update values."
+                )
+            if (not drop_all_old) and (len(np.unique(rows)) != len(posidx.obs_ids)):
+                raise ValueError(
+                    "Updating of existing variables only allowed"
+                    " if values for all observations"
+                    " are provided  or 'drop_all_old=True'"
+                )
+        layout = self.layout
+        with self.store_format.open(self.filename, "r+") as f:
+            for i, name in enumerate(meas_ids.astype(str)):
+                column = np.full(len(posidx.obs_ids), np.nan)
+                column[rows] = values[:, i]
+                self.store_format.write_column(f, name, column, **layout)
+
+    def delete_measurements(self, meas_ids):
+        """
+        Deletes measurements.
+
+        Args:
+            meas_ids: the measurement ids to be deleted
+        """
+        with self.store_format.open(self.filename, "r+") as f:
+            for name in io_anndata.as_ids(meas_ids).astype(str):
+                if name in f[COLUMNS]:
+                    self.store_format.delete_column(f, name)
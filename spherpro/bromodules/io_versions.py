@@ -0,0 +1,259 @@
+"""
+Versioned snapshots of the measurement files.
+
+Every write creates a new, immutable version file which is published by
+atomically replacing a small pointer file. Readers follow the pointer and
+keep the version they opened, thus they never see a partially written
+file and never need a lock. Writers publish with a compare and swap of the
+pointer, thus a version written on top of an outdated one is rejected.
+"""
+import contextlib
+import glob
+import json
+import logging
+import os
+import pathlib
+import time
+
+SUFFIX_CURRENT = ".current"
+SUFFIX_LOCK = ".lock"
+# marks a version that was replaced, see FileVersions.retire
+SUFFIX_RETIRED = ".retired"
+# seconds to wait for the lock of the pointer file
+LOCK_TIMEOUT = 60
+LOCK_POLL = 0.05
+GENERATION = "generation"
+FILENAME = "filename"
+PARENT = "parent"
+CREATED = "created"
+
+
+class FileVersions:
+    """
+    The versions of a measurement file.
+
+    The versions of e.g. cell.h5ad are stored as cell.000001.h5ad,
+    cell.000002.h5ad, ... and cell.h5ad.current points to the current one.
+    A file written before versioning is treated as generation 0.
+    """
+
+    def __init__(self, filename, sidecars=()):
+        """
+        Args:
+            filename: the unversioned filename of the measurement file
+            sidecars: suffixes of files derived from a version file,
+                e.g. its position index, removed together with it
+        """
+        self.filename = pathlib.Path(filename)
+        self.sidecars = sidecars
+
+    @property
+    def pointer_filename(self):
+        return pathlib.Path(str(self.filename) + SUFFIX_CURRENT)
+
+    def get_version_filename(self, generation):
+        """
+        Returns the filename of a generation
+        """
+        if generation == 0:
+            return self.filename
+        fn = self.filename
+        return fn.with_name(f"{fn.stem}.{generation:06d}{fn.suffix}")
+
+    def get_current(self):
+        """
+        Returns the manifest of the current version,
+        None if the file was never written.
+        """
+        try:
+            with open(self.pointer_filename) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            if self.filename.exists():
+                return {GENERATION: 0, FILENAME: self.filename.name}
+            return None
+
+    @property
+    def current_generation(self):
+        """
+        The generation of the current version, None if the file
+        was never written.
+        """
+        manifest = self.get_current()
+        if manifest is None:
+            return None
+        return manifest[GENERATION]
+
+    @property
+    def current_filename(self):
+        """
+        The filename of the current version, None if the file
+        was never written.
+        """
+        manifest = self.get_current()
+        if manifest is None:
+            return None
+        return self.filename.with_name(manifest[FILENAME])
+
+    def reserve(self):
+        """
+        Claims the filename of a new generation.
+
+        The file is created empty, such that concurrent writers never
+        write to the same version.
+
+        Returns:
+            the generation and its filename
+        """
+        manifest = self.get_current()
+        generation = 1 if manifest is None else manifest[GENERATION] + 1
+        while True:
+            fn = self.get_version_filename(generation)
+            try:
+                with open(fn, "x"):
+                    return generation, fn
+            except FileExistsError:
+                generation += 1
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Holds the lock file of the pointer, waits at most LOCK_TIMEOUT
+        seconds for other writers.
+        """
+        fn = f"{self.pointer_filename}{SUFFIX_LOCK}"
+        t_end = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(fn, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                if time.monotonic() > t_end:
+                    raise ValueError(
+                        f"Timeout waiting for the lock {fn}, remove it"
+                        f" if no other process is writing {self.filename}."
+                    )
+                time.sleep(LOCK_POLL)
+        try:
+            yield
+        finally:
+            os.remove(fn)
+
+    def publish(self, generation, base):
+        """
+        Makes a written generation the current version, if the current
+        version is still the one it was written on top of.
+
+        The pointer file is replaced atomically, readers see either
+        the old or the new version.
+
+        Args:
+            generation: the generation written
+            base: the generation it was written on top of,
+                None if the file was not written before
+
+        Returns:
+            the manifest of the published generation
+        """
+        with self._lock():
+            current = self.current_generation
+            if current != base:
+                raise ValueError(
+                    f"{self.filename} was changed concurrently: generation"
+                    f" {generation} is based on generation {base}, but"
+                    f" generation {current} is current."
+                )
+            manifest = {
+                GENERATION: generation,
+                FILENAME: self.get_version_filename(generation).name,
+                PARENT: current,
+                CREATED: time.strftime("%Y%m%d-%H%M%S"),
+            }
+            fn_tmp = f"{self.pointer_filename}.{generation}.tmp"
+            with open(fn_tmp, "w") as f:
+                json.dump(manifest, f)
+            os.replace(fn_tmp, self.pointer_filename)
+        return manifest
+
+    def discard(self, generation):
+        """
+        Removes a generation that was reserved but not published.
+        """
+        self.remove(generation)
+
+    def get_filenames(self, generation):
+        """
+        Returns the file of a generation and its sidecar files
+        """
+        fn = self.get_version_filename(generation)
+        return [fn] + [pathlib.Path(str(fn) + suffix) for suffix in self.sidecars]
+
+    def remove(self, generation):
+        """
+        Removes the file of a generation that is not current anymore,
+        together with its sidecar files.
+        """
+        fn = self.get_version_filename(generation)
+        for fn_rm in self.get_filenames(generation) + [
+            pathlib.Path(str(fn) + SUFFIX_RETIRED)
+        ]:
+            try:
+                os.remove(fn_rm)
+            except FileNotFoundError:
+                pass
+
+    def retire(self, generation):
+        """
+        Marks a generation that was replaced for removal by remove_retired.
+
+        The file is kept for a while, as readers may have read the
+        pointer to it just before it was replaced.
+        """
+        fn = f"{self.get_version_filename(generation)}{SUFFIX_RETIRED}"
+        with open(fn, "w") as f:
+            f.write(str(generation))
+
+    def get_retired(self):
+        """
+        Returns the retired generations that are not current
+
+        Returns:
+            a dict of the generations and the time they were retired,
+            in seconds since the epoch
+        """
+        fn = self.filename
+        pattern = glob.escape(str(fn.with_name(fn.stem))) + "*" + SUFFIX_RETIRED
+        current = self.current_generation
+        retired = dict()
+        for fn_retired in glob.glob(pattern):
+            try:
+                with open(fn_retired) as f:
+                    generation = int(f.read())
+                t_retired = os.stat(fn_retired).st_mtime
+            except (FileNotFoundError, ValueError):
+                continue
+            # the pattern also matches e.g. other object types
+            if fn_retired != f"{self.get_version_filename(generation)}{SUFFIX_RETIRED}":
+                continue
+            if generation != current:
+                retired[generation] = t_retired
+        return retired
+
+    def remove_retired(self, grace_period=0):
+        """
+        Removes the generations retired at least grace_period seconds ago.
+        """
+        t_max = time.time() - grace_period
+        for generation, t_retired in self.get_retired().items():
+            if t_retired <= t_max:
+                self.try_remove(generation)
+
+    def try_remove(self, generation):
+        """
+        Removes a generation that is not current anymore, logs instead
+        of failing if it is still opened, e.g. on windows.
+        """
+        try:
+            self.remove(generation)
+        except OSError as e:
+            logging.debug(f"{self.get_version_filename(generation)} not removed: {e}")
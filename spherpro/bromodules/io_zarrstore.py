@@ -0,0 +1,219 @@
+"""
+A zarr directory store as a backend for the object measurements.
+
+Same structure as the column store, but every measurement is a chunked
+zarr array with one file per chunk. Thus several processes can read
+disjoint chunks in parallel and columns can be written while other
+processes are reading the store. Appended rows become visible to them
+once committed, see io_columnstore.N_ROWS.
+"""
+import os
+import pathlib
+import uuid
+
+import numpy as np
+
+try:
+    import numcodecs
+    import zarr
+except ImportError:
+    numcodecs = None
+    zarr = None
+
+import spherpro.bromodules.io_anndata as io_anndata
+import spherpro.bromodules.io_columnstore as io_columnstore
+import spherpro.configuration as config
+from spherpro.bromodules.io_columnstore import CHUNK_ROWS, COLUMNS, N_ROWS, OBS_IDS
+
+SUFFIX_ZARRSTORE = ".zarr"
+# groups of columns being written and being deleted
+TMP = "tmp"
+TRASH = "trash"
+# default level of the gzip codec, as in h5py
+GZIP_LEVEL = 4
+
+
+def get_zarrstore_filename(conf: object, object_type: str):
+    fn = pathlib.Path(conf["sqlite"]["db"]).parent / (object_type + SUFFIX_ZARRSTORE)
+    return fn
+
+
+def _check_zarr():
+    if zarr is None:
+        raise ValueError("The zarr measurement store requires the zarr package.")
+
+
+def get_zarr_compression(codec, opts=None, shuffle=False, dtype=np.float64):
+    """
+    Returns the zarr array options of a codec
+
+    Args:
+        codec: None, 'gzip' or 'blosc'
+        opts: the options of the codec, e.g. the gzip level or
+            a dict of numcodecs.Blosc arguments
+        shuffle: should the bytes be shuffled before compression?
+        dtype: the dtype of the array
+    """
+    _check_zarr()
+    if codec is None:
+        return {"compressor": None}
+    if codec == io_anndata.CODEC_GZIP:
+        filters = None
+        if shuffle:
+            filters = [numcodecs.Shuffle(elementsize=np.dtype(dtype).itemsize)]
+        return {
+            "compressor": numcodecs.GZip(level=GZIP_LEVEL if opts is None else opts),
+            "filters": filters,
+        }
+    if codec == io_anndata.CODEC_BLOSC:
+        opts = {
+            "shuffle": numcodecs.Blosc.SHUFFLE
+            if shuffle
+            else numcodecs.Blosc.NOSHUFFLE,
+            **(opts or {}),
+        }
+        return {"compressor": numcodecs.Blosc(**opts)}
+    raise ValueError(
+        f"The codec {codec} is not supported by the zarr store,"
+        f" valid are: {[None, io_anndata.CODEC_GZIP, io_anndata.CODEC_BLOSC]}"
+    )
+
+
+def get_zarr_layout(conf):
+    """
+    Returns the configured measurement layout as accepted
+    by the zarr store writer.
+    """
+    layout = conf[config.MEASUREMENT_LAYOUT]
+    # fail early on codecs not supported
+    get_zarr_compression(layout[config.COMPRESSION])
+    return {
+        "dtype": io_anndata.get_measurement_dtype(conf),
+        "compression": layout[config.COMPRESSION],
+        "compression_opts": layout[config.COMPRESSION_OPTS],
+        "shuffle": layout[config.SHUFFLE],
+        "chunk_rows": layout[config.CHUNK_ROWS],
+        "chunk_cols": layout[config.CHUNK_COLS],
+    }
+
+
+class ZarrColumns(io_columnstore.Hdf5Columns):
+    """
+    The storage primitives of the zarr store, a directory store
+    with an array per column.
+
+    New columns are written to a temporary array and moved in place,
+    deleted columns are moved out before removing their chunks.
+    Thus readers never see partially written chunks or columns.
+    """
+
+    @staticmethod
+    def create(filename):
+        _check_zarr()
+        f = zarr.open_group(str(filename), mode="w")
+        f.create_dataset(OBS_IDS, shape=(0,), chunks=(CHUNK_ROWS,), dtype=np.int64)
+        for group in [COLUMNS, TMP, TRASH]:
+            f.create_group(group)
+        f.attrs[N_ROWS] = 0
+        return f
+
+    @staticmethod
+    def open(filename, mode="r"):
+        _check_zarr()
+        return zarr.open_group(str(filename), mode=mode)
+
+    @staticmethod
+    def close(f):
+        f.store.close()
+
+    @staticmethod
+    def _create_array(
+        f,
+        path,
+        dtype=np.float64,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        chunk_rows=None,
+        chunk_cols=None,
+    ):
+        return f.create_dataset(
+            path,
+            shape=f[OBS_IDS].shape,
+            chunks=(chunk_rows or CHUNK_ROWS,),
+            dtype=dtype,
+            fill_value=np.nan,
+            **get_zarr_compression(compression, compression_opts, shuffle, dtype),
+        )
+
+    @classmethod
+    def create_column(cls, f, name, **layout):
+        """
+        Creates a column for all current rows, filled with NaN.
+
+        The remaining arguments define the storage layout,
+        see get_zarr_layout. chunk_cols is ignored.
+        """
+        return cls._create_array(f, f"{COLUMNS}/{name}", **layout)
+
+    @classmethod
+    def write_column(cls, f, name, column, **layout):
+        """
+        Writes all values of a column.
+
+        Existing columns are overwritten chunk by chunk, each chunk file
+        being replaced atomically. New columns are written to a temporary
+        array and moved in place.
+        """
+        path = f"{COLUMNS}/{name}"
+        if path in f:
+            f[path][: len(column)] = column
+            return
+        tmp = f"{TMP}/{name}-{uuid.uuid4().hex}"
+        cls._create_array(f, tmp, **layout)[: len(column)] = column
+        f.move(tmp, path)
+
+    @staticmethod
+    def delete_column(f, name):
+        path = f"{COLUMNS}/{name}"
+        if path in f:
+            trash = f"{TRASH}/{name}-{uuid.uuid4().hex}"
+            f.move(path, trash)
+            del f[trash]
+
+    @staticmethod
+    def get_key(filename):
+        """
+        Returns a key changing whenever rows or columns
+        are added or removed, or rows are committed.
+        """
+        st_obs = os.stat(os.path.join(filename, OBS_IDS, ".zarray"))
+        st_cols = os.stat(os.path.join(filename, COLUMNS))
+        fn_attrs = os.path.join(filename, ".zattrs")
+        st_attrs = os.stat(fn_attrs).st_mtime_ns if os.path.exists(fn_attrs) else 0
+        return np.array(
+            [st_obs.st_size, st_obs.st_mtime_ns, st_cols.st_mtime_ns, st_attrs],
+            dtype=np.int64,
+        )
+
+
+class ZarrStoreWriter(io_columnstore.ColumnStoreWriter):
+    """
+    Writes a zarr store chunk by chunk.
+    """
+
+    store_format = ZarrColumns
+
+
+class IoZarrStore(io_columnstore.IoColumnStore):
+    """
+    Stores the measurements of an object type in a zarr directory
+    store with one array per measurement.
+
+    Provides the same interface as IoAnnData.
+    """
+
+    writer = ZarrStoreWriter
+    store_format = ZarrColumns
+    get_filename = staticmethod(get_zarrstore_filename)
+    get_layout = staticmethod(get_zarr_layout)
@@ -0,0 +1,31 @@
+import importlib
+
+
+class LazyNamespace(object):
+    """
+    A namespace of bro modules that are imported and instantiated
+    on first access.
+
+    Subclasses define MODULES, a dict mapping the attribute name to
+    (module name, class name). The class is instantiated with the bro,
+    if the class name is None the module itself is returned.
+    """
+
+    MODULES = {}
+
+    def __init__(self, bro=None):
+        self.bro = bro
+
+    def __getattr__(self, name):
+        # only called if the attribute is not set yet
+        if name not in self.MODULES or name == "bro":
+            raise AttributeError(name)
+        modname, clsname = self.MODULES[name]
+        obj = importlib.import_module(modname)
+        if clsname is not None:
+            obj = getattr(obj, clsname)(self.bro)
+        setattr(self, name, obj)
+        return obj
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()).union(self.MODULES))
@@ -232,7 +232,16 @@ class PlotHeatmask(plot_base.BasePlot):
             (db.measurement_names.measurement_name.key, "MeanIntensity"),
             (db.measurement_types.measurement_type.key, None),
         ]
-        self.interactive = InteractiveHeatplot(self.data.main_session, self)
+        self._interactive = None
+
+    @property
+    def interactive(self):
+        """
+        The interactive heatplot, built on first use.
+        """
+        if self._interactive is None:
+            self._interactive = InteractiveHeatplot(self.data.main_session, self)
+        return self._interactive
 
     def _prepare_masks(
         self, image_ids: Iterable[int], object_type: str
@@ -295,7 +304,7 @@ class PlotHeatmask(plot_base.BasePlot):
         q_obj = q_obj.add_columns(db.objects.object_number)
 
         if image_ids is not None:
-            q_obj = q_obj.filter(db.images.image_id.in_(image_ids))
+            q_obj = q_obj.filter(db.objects.image_id.in_(image_ids))
         if len(filters) > 0:
             q_obj = q_obj.join(db.object_filters)
         for fil in filters:
@@ -303,9 +312,10 @@ class PlotHeatmask(plot_base.BasePlot):
             # This needs to be done with subqueries!
             q_obj = q_obj.filter(fil)
 
-        data = self.objmeasurements.get_measurements(q_obj=q_obj, q_meas=q_meas)
-        data = self.objmeasurements.scale_anndata(data)
-        data = self.objmeasurements.convert_anndata_legacy(data)
+        data = self.objmeasurements.get_measurements(
+            q_obj=q_obj, q_meas=q_meas, scale=True
+        )
+        data = self.objmeasurements.convert_anndata_longform(data, categorical=False)
         return data
 
     def assemble_heatmap_image(
@@ -1,14 +1,22 @@
-import spherpro.bromodules.plot_debarcodequality as plot_debarcodequality
-import spherpro.bromodules.plot_heatmask as plot_heatmask
-import spherpro.bromodules.plot_scatterplot as plot_scatterplot
+import spherpro.bromodules.lazy as lazy
 
 
-class Plots(object):
-    def __init__(self):
-        pass
+class Plots(lazy.LazyNamespace):
+    MODULES = {
+        "scatterplot": (
+            "spherpro.bromodules.plot_scatterplot",
+            "PlotScatter",
+        ),
+        "heatmask": ("spherpro.bromodules.plot_heatmask", "PlotHeatmask"),
+        "debarcoedequality": (
+            "spherpro.bromodules.plot_debarcodequality",
+            "PlotDebarcodeQuality",
+        ),
+        "debarcoededcells": (
+            "spherpro.bromodules.plot_debarcodequality",
+            "PlotDebarcodeCells",
+        ),
+    }
 
     def load_modules(self, bro):
-        self.scatterplot = plot_scatterplot.PlotScatter(bro)
-        self.heatmask = plot_heatmask.PlotHeatmask(bro)
-        self.debarcoedequality = plot_debarcodequality.PlotDebarcodeQuality(bro)
-        self.debarcoededcells = plot_debarcodequality.PlotDebarcodeCells(bro)
+        self.bro = bro
@@ -1,15 +1,22 @@
-import spherpro.bromodules.processing_debarcoding as processing_debarcoding
-import spherpro.bromodules.processing_dist_rim as processing_dist_rim
-import spherpro.bromodules.processing_measurementmaker as processing_mm
-import spherpro.bromodules.processing_nb_agg as processing_nb_agg
+import spherpro.bromodules.lazy as lazy
 
 
-class Processing(object):
-    def __init__(self):
-        pass
+class Processing(lazy.LazyNamespace):
+    MODULES = {
+        "measurement_maker": (
+            "spherpro.bromodules.processing_measurementmaker",
+            "MeasurementMaker",
+        ),
+        "debarcode": ("spherpro.bromodules.processing_debarcoding", "Debarcode"),
+        "calculate_dist_rim": (
+            "spherpro.bromodules.processing_dist_rim",
+            "CalculateDistRim",
+        ),
+        "nb_aggregation": (
+            "spherpro.bromodules.processing_nb_agg",
+            "AggregateNeightbours",
+        ),
+    }
 
     def load_modules(self, bro):
-        self.measurement_maker = processing_mm.MeasurementMaker(bro)
-        self.debarcode = processing_debarcoding.Debarcode(bro)
-        self.calculate_dist_rim = processing_dist_rim.CalculateDistRim(bro)
-        self.nb_aggregation = processing_nb_agg.AggregateNeightbours(bro)
+        self.bro = bro
@@ -4,7 +4,7 @@ import numpy as np
 import pandas as pd
 import plotnine as gg
 
-import spherpro as sp
+import spherpro.bromodules.filter_measurements as filter_measurements
 import spherpro.configuration as conf
 import spherpro.db as db
 
@@ -24,7 +24,7 @@ class Debarcode(object):
     def __init__(self, bro):
         self.bro = bro
         self.data = bro.data
-        self.filter = sp.bromodules.filter_measurements.FilterMeasurements(self.bro)
+        self.filter = filter_measurements.FilterMeasurements(self.bro)
         self.defaults_rawdist = bro.data.conf[conf.QUERY_DEFAULTS][conf.RAWDIST]
         self.defaults_channels = bro.data.conf[conf.QUERY_DEFAULTS][
             conf.CHANNEL_MEASUREMENTS
@@ -103,7 +103,7 @@ class Debarcode(object):
             borderdist=borderdist,
             stack=stack,
             measurement_name=measurement_name,
-            additional_meta=[db.sites.site_id],
+            additional_meta=[db.object_meta.site_id],
         )
         bcvals = bcdat.stack()
         bcvals.name = "value"
@@ -144,6 +144,7 @@ class Debarcode(object):
                 db.images.image_id == row[db.images.image_id.key]
             ).update(row)
         session.commit()
+        self.data.refresh_object_conditions()
 
     @staticmethod
     def _default_treshfun(x):
@@ -287,20 +288,19 @@ class Debarcode(object):
         q_obj = (
             self.data.get_objectmeta_query()
             .filter(db.objects.object_type == self.DEFAULT_OBJTYPE)
-            .add_columns(db.sampleblocks.sampleblock_id)
+            .add_columns(db.object_meta.sampleblock_id)
         )
 
         if additional_meta is not None:
             q_obj = q_obj.add_columns(*additional_meta)
         dat_obj = bro.doquery(q_obj)
 
-        dat_filmeas = bro.doquery(
-            self.data.get_measmeta_query()
-            .filter(db.measurements.measurement_id == dist_measid)
-            .add_columns(db.ref_stacks.scale)
+        dat_filmeas = self.data.catalog.get_measmeta(
+            db.ref_stacks.scale, measurement_id=dist_measid
+        )
+        dat_fil = bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_filmeas, scale=True
         )
-        dat_fil = bro.io.objmeasurements.get_measurements(dat_obj, dat_filmeas)
-        dat_fil = bro.io.objmeasurements.scale_anndata(dat_fil)
 
         # Get the distance filters
         distfils = [(dist_measid, operator.gt, borderdist)]
@@ -322,8 +322,9 @@ class Debarcode(object):
             .filter(fil_meas)
             .add_columns(db.ref_stacks.scale, db.ref_planes.channel_name)
         )
-        dat_cells = bro.io.objmeasurements.get_measurements(dat_obj, dat_meas)
-        dat_cells = bro.io.objmeasurements.scale_anndata(dat_cells)
+        dat_cells = bro.io.objmeasurements.get_measurements(
+            dat_obj, dat_meas, scale=True
+        )
 
         dat_bccells = pd.DataFrame(
             dat_cells.X,
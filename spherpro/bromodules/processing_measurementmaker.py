@@ -1,4 +1,5 @@
 import pandas as pd
+from sqlalchemy.inspection import inspect
 
 import spherpro.bromodules.plot_base as base
 import spherpro.configuration as conf
@@ -15,18 +16,38 @@ class MeasurementMaker(base.BasePlot):
         super().__init__(bro)
 
     def register_measurement_name(self, new_measname):
-        x = db.measurement_names()
-        x.measurement_name = new_measname
-        self.session.merge(x)
-        self.session.commit()
+        self.register_measurement_names([new_measname])
 
     def register_measurement_type(self, new_meastype):
-        x = db.measurement_types()
-        x.measurement_type = new_meastype
-        self.session.merge(x)
-        self.session.commit()
+        self.register_measurement_types([new_meastype])
+
+    def register_measurement_names(self, measnames, commit=True):
+        """
+        Registers all measurement names not yet present in one statement.
+        """
+        self._register_missing_keys(db.measurement_names, measnames, commit=commit)
+
+    def register_measurement_types(self, meastypes, commit=True):
+        """
+        Registers all measurement types not yet present in one statement.
+        """
+        self._register_missing_keys(db.measurement_types, meastypes, commit=commit)
 
-    def register_objects(self, object_meta, assume_new=False):
+    def _register_missing_keys(self, table, keys, commit=True):
+        """
+        Inserts the keys not yet present in a single column table.
+        """
+        col = inspect(table).primary_key[0]
+        existing = {k for (k,) in self.session.query(col)}
+        new_keys = set(map(str, keys)) - existing
+        if len(new_keys) > 0:
+            self.session.bulk_insert_mappings(
+                table, [{col.key: k} for k in sorted(new_keys)]
+            )
+        if commit:
+            self.session.commit()
+
+    def register_objects(self, object_meta, assume_new=False, refresh_meta=True):
         """
         Registers an object metadata table
         Needs to have the columns:
@@ -42,6 +63,9 @@ class MeasurementMaker(base.BasePlot):
 
         If assume_new is True, the objects are assumed to be guaranteed
         new - use with care!
+
+        If refresh_meta is False, the object_meta table is not updated,
+        e.g. as the import rebuilds it once all objects are registered.
         """
         COL_OBJ_ID = db.objects.object_id.key
         img_dict = {
@@ -50,21 +74,9 @@ class MeasurementMaker(base.BasePlot):
         }
         object_meta[db.images.image_id.key] = object_meta[
             db.images.image_number.key
-        ].replace(img_dict)
+        ].map(img_dict)
         if assume_new == False:
-            object_meta[COL_OBJ_ID] = [
-                l[0] if l is not None else None
-                for l in [
-                    self.session.query(COL_OBJ_ID)
-                    .filter(
-                        db.objects.object_number == row[db.objects.object_number.key],
-                        db.objects.image_id == row[db.objects.image_id.key],
-                        db.objects.object_type == row[db.objects.object_type.key],
-                    )
-                    .one_or_none()
-                    for idx, row in object_meta.iterrows()
-                ]
-            ]
+            object_meta[COL_OBJ_ID] = self._query_object_ids(object_meta)
         else:
             object_meta[COL_OBJ_ID] = None
         fil = object_meta[COL_OBJ_ID].isnull()
@@ -74,8 +86,55 @@ class MeasurementMaker(base.BasePlot):
             )
             # object_meta[COL_OBJ_ID] = object_meta[COL_OBJ_ID].astype(np.int)
             self.bro.data._bulkinsert(object_meta.loc[fil, :], db.objects)
+            if refresh_meta:
+                self.bro.data.refresh_object_meta(
+                    image_ids=[
+                        int(i)
+                        for i in object_meta.loc[fil, db.objects.image_id.key].unique()
+                    ]
+                )
         return object_meta
 
+    def _query_object_ids(self, object_meta):
+        """
+        Looks up the object_ids of already registered objects.
+
+        Instead of querying every object individually, all objects of the
+        requested object types are fetched at once and matched by a merge on
+        (object_number, image_id, object_type).
+
+        Args:
+            object_meta: a table with the columns object_number, image_id and
+                object_type
+
+        Returns:
+            An array with the object_id for every row of object_meta,
+            None for objects that are not registered yet.
+        """
+        keys = [
+            db.objects.object_number.key,
+            db.objects.image_id.key,
+            db.objects.object_type.key,
+        ]
+        obj_types = [str(t) for t in object_meta[db.objects.object_type.key].unique()]
+        dat_existing = self.bro.doquery(
+            self.session.query(
+                db.objects.object_number,
+                db.objects.image_id,
+                db.objects.object_type,
+                db.objects.object_id,
+            ).filter(db.objects.object_type.in_(obj_types))
+        )
+        dat_existing = dat_existing.drop_duplicates(subset=keys)
+        object_ids = (
+            object_meta.loc[:, keys]
+            .merge(dat_existing, how="left", on=keys)[db.objects.object_id.key]
+            .astype("Int64")
+            .astype(object)
+        )
+        object_ids[object_ids.isnull()] = None
+        return object_ids.values
+
     def register_single_measurement(self, measurement_name, measurement_type, plane_id):
         dat_measure_meta = pd.DataFrame(
             {
@@ -93,32 +152,42 @@ class MeasurementMaker(base.BasePlot):
         will be added automatically.
         """
         measure_meta = measure_meta.copy()
-        # make sure the names and types are present:
-        for m in measure_meta[MEAS_NAME].unique():
-            self.register_measurement_name(m)
-        for m in measure_meta[MEAS_TYPE].unique():
-            self.register_measurement_type(m)
-        measure_meta[MEAS_ID] = [
-            l[0] if l is not None else None
-            for l in [
-                self.session.query(db.measurements.measurement_id)
-                .filter(
-                    db.measurements.measurement_name == row[MEAS_NAME],
-                    db.measurements.measurement_type == row[MEAS_TYPE],
-                    db.measurements.plane_id == row[MEAS_PLANE],
+        keys = [MEAS_NAME, MEAS_TYPE, MEAS_PLANE]
+        # resolve the existing measurements in one query,
+        # keyed on the (name, type, plane_id) unique constraint
+        dat_existing = self.bro.doquery(
+            self.session.query(db.measurements).filter(
+                db.measurements.measurement_name.in_(
+                    [str(m) for m in measure_meta[MEAS_NAME].unique()]
                 )
-                .one_or_none()
-                for idx, row in measure_meta.iterrows()
-            ]
-        ]
+            )
+        )
+        dat_existing = dat_existing.loc[:, keys + [MEAS_ID]]
+        measure_meta[MEAS_ID] = (
+            measure_meta.loc[:, keys]
+            .merge(dat_existing, how="left", on=keys)[MEAS_ID]
+            .astype("Int64")
+            .astype(object)
+            .values
+        )
 
         fil = measure_meta[MEAS_ID].isnull()
         if sum(fil) > 0:
-            measure_meta.loc[fil, MEAS_ID] = self.bro.data._query_new_ids(
-                db.measurements.measurement_id, sum(fil)
+            dat_new = measure_meta.loc[fil, keys].drop_duplicates()
+            dat_new[MEAS_ID] = self.bro.data._query_new_ids(
+                db.measurements.measurement_id, dat_new.shape[0]
             )
-            # measure_meta[MEAS_ID] = measure_meta[MEAS_ID].astype(int)
-            self.bro.data._bulkinsert(measure_meta.loc[fil, :], db.measurements)
+            measure_meta.loc[fil, MEAS_ID] = (
+                measure_meta.loc[fil, keys].merge(dat_new, how="left")[MEAS_ID].values
+            )
+            # make sure the names and types are present:
+            self.register_measurement_names(dat_new[MEAS_NAME].unique(), commit=False)
+            self.register_measurement_types(dat_new[MEAS_TYPE].unique(), commit=False)
+            self.session.bulk_insert_mappings(
+                db.measurements,
+                dat_new.astype(object).to_dict(orient="records"),
+            )
+        self.session.commit()
         return measure_meta
 
     def add_object_measurements(self, dat_meas, replace=True, drop_all_old=False):
@@ -127,9 +127,11 @@ class AggregateNeightbours(object):
         if plane_id is not None:
             q_meas = q_meas.filter(db.planes.plane_id == plane_id)
         if image_id is not None:
-            q_obj = q_obj.filter(db.images.image_id == image_id)
+            q_obj = q_obj.filter(db.objects.image_id == image_id)
         adat = self.bro.io.objmeasurements.get_measurements(q_obj=q_obj, q_meas=q_meas)
-        dat = self.bro.io.objmeasurements.convert_anndata_legacy(adat)
+        dat = self.bro.io.objmeasurements.convert_anndata_longform(
+            adat, obs_cols=[OBJ_TYPE], var_cols=[], categorical=False
+        )
         return dat
 
     @staticmethod
@@ -156,11 +158,10 @@ class AggregateNeightbours(object):
                 db.measurements.measurement_id.in_(old_ids)
             )
         )
-        dic_meas_name = dict()
-        for m in measure_meta[db.measurements.measurement_name.key].unique():
-            m_new = meas_name_prefix + m
-            dic_meas_name.update({m: m_new})
-            self._register_measurement_name(m_new)
+        dic_meas_name = {
+            m: meas_name_prefix + m
+            for m in measure_meta[db.measurements.measurement_name.key].unique()
+        }
         measure_meta[db.measurements.measurement_name.key] = measure_meta[
             db.measurements.measurement_name.key
         ].replace(dic_meas_name)
@@ -0,0 +1,179 @@
+# Backend specific bulk loaders used by the datastore
+import csv
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# number of rows converted and sent at once
+BLOCKSIZE = 100000
+
+MYSQL_NULL = "\\N"
+# characters escaped in LOAD DATA, the field and line terminators are
+# escaped as well, such that the values never need to be enclosed
+MYSQL_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t", "\0": "\\0"}
+MYSQL_FIELD_SEP = "\t"
+
+
+def _prepare(data):
+    """
+    Converts boolean columns to integers, as not all backends
+    accept 'True'/'False' in text based bulk loads.
+    """
+    boolcols = [c for c, t in data.dtypes.items() if t == np.bool_]
+    if len(boolcols) > 0:
+        data = data.astype({c: int for c in boolcols})
+    return data
+
+
+def _iter_blocks(data, blocksize=BLOCKSIZE):
+    for start in range(0, data.shape[0], blocksize):
+        yield data.iloc[start : (start + blocksize)]
+
+
+def _to_records(data):
+    """
+    Converts a dataframe into a list of tuples of python objects,
+    missing values are converted to None.
+    """
+    data = data.astype(object).where(pd.notnull(data), None)
+    return list(data.itertuples(index=False, name=None))
+
+
+def _escape_mysql(data):
+    """
+    Escapes the string values for LOAD DATA with the default escape
+    character, missing values are written as \\N.
+    """
+    data = data.copy()
+    for col, dtype in data.dtypes.items():
+        if dtype == object:
+            values = data[col]
+            isnull = values.isnull()
+            values = values.astype(str)
+            for char, esc in MYSQL_ESCAPES.items():
+                values = values.str.replace(char, esc, regex=False)
+            data[col] = values.where(~isnull, None)
+    return data
+
+
+def load_pandas(data, table, engine):
+    """
+    Generic loader using multi row INSERT statements.
+
+    Args:
+        data: a dataframe with the columns of the table
+        table: an sqlalchemy table definition
+        engine: an sqlalchemy engine
+
+    Returns:
+        The number of rows inserted
+    """
+    data.to_sql(
+        table.__table__.name,
+        engine,
+        if_exists="append",
+        index=False,
+        method="multi",
+        chunksize=999,
+    )
+    return data.shape[0]
+
+
+def load_sqlite(data, table, engine):
+    """
+    Loads the data with a prepared executemany within a single transaction.
+
+    The synchronous and cache_size pragmas are tuned during the load
+    and restored afterwards.
+    """
+    cols = ", ".join(data.columns)
+    values = ", ".join(["?"] * data.shape[1])
+    stmt = f"INSERT INTO {table.__table__.name} ({cols}) VALUES ({values})"
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        synchronous = cur.execute("PRAGMA synchronous").fetchone()[0]
+        cache_size = cur.execute("PRAGMA cache_size").fetchone()[0]
+        cur.execute("PRAGMA synchronous = OFF")
+        cur.execute("PRAGMA cache_size = -262144")
+        try:
+            for block in _iter_blocks(_prepare(data)):
+                cur.executemany(stmt, _to_records(block))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute(f"PRAGMA synchronous = {synchronous}")
+            cur.execute(f"PRAGMA cache_size = {cache_size}")
+    finally:
+        conn.close()
+    return data.shape[0]
+
+
+def load_postgresql(data, table, engine):
+    """
+    Loads the data using COPY FROM STDIN.
+    """
+    cols = ", ".join(data.columns)
+    stmt = f"COPY {table.__table__.name} ({cols}) FROM STDIN WITH (FORMAT csv)"
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        try:
+            for block in _iter_blocks(_prepare(data)):
+                buf = io.StringIO()
+                block.to_csv(buf, index=False, header=False)
+                buf.seek(0)
+                cur.copy_expert(stmt, buf)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    return data.shape[0]
+
+
+def load_mysql(data, table, engine):
+    """
+    Loads the data using LOAD DATA LOCAL INFILE.
+
+    Requires the connection to be opened with local_infile enabled.
+    The values are written tab separated, with backslashes, tabs and
+    line breaks escaped, see _escape_mysql.
+    """
+    cols = ", ".join(data.columns)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        try:
+            for block in _iter_blocks(_prepare(data)):
+                with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+                    _escape_mysql(block).to_csv(
+                        f,
+                        index=False,
+                        header=False,
+                        sep=MYSQL_FIELD_SEP,
+                        na_rep=MYSQL_NULL,
+                        quoting=csv.QUOTE_NONE,
+                    )
+                try:
+                    cur.execute(
+                        f"LOAD DATA LOCAL INFILE '{f.name}' "
+                        f"INTO TABLE {table.__table__.name} "
+                        "FIELDS TERMINATED BY '\\t' ENCLOSED BY '' ESCAPED BY '\\\\' "
+                        f"LINES TERMINATED BY '\\n' ({cols})"
+                    )
+                finally:
+                    os.remove(f.name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    return data.shape[0]
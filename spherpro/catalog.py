@@ -0,0 +1,384 @@
+"""
+An in memory catalog of the measurement and image metadata.
+
+The metadata is small compared to the objects, but most modules query it
+again and again as joins over many tables. The catalog loads each join once
+into a dataframe indexed by its id and serves lookups and filters from
+memory. It is reloaded once the database generation changed, which is
+bumped on every write to the cached tables, see watch_writes.
+
+The generation is counted in this process and in the db_generation table,
+such that writes by other processes are seen as well, at the latest
+GENERATION_CHECK_INTERVAL seconds later. Databases without the table,
+i.e. written by older versions and opened read only, only see the writes
+of this process.
+"""
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+import spherpro.db as db
+
+MEASMETA = "measmeta"
+IMAGEMETA = "imagemeta"
+COL_VALID_IMAGE = "valid_image"
+
+# seconds the generation read from the db_generation table is reused
+GENERATION_CHECK_INTERVAL = 1.0
+
+# the tables joined to the measurements and images in the cached tables
+MEASMETA_JOINED = [
+    db.measurement_types,
+    db.measurement_names,
+    db.planes,
+    db.stacks,
+    db.ref_planes,
+    db.ref_stacks,
+]
+IMAGEMETA_JOINED = [
+    db.acquisitions,
+    db.sites,
+    db.slideacs,
+    db.slides,
+    db.sampleblocks,
+]
+CATALOG_TABLES = {
+    tab.__table__.name
+    for tab in [db.measurements, db.images, db.valid_images]
+    + MEASMETA_JOINED
+    + IMAGEMETA_JOINED
+}
+
+# statements changing the schema, only invalidate the catalog of this process
+SCHEMA_STATEMENTS = {"CREATE", "DROP", "ALTER"}
+# statements changing the data, counted in the db_generation table
+# if they modify a cached table
+MODIFY_STATEMENTS = {"INSERT", "UPDATE", "DELETE", "REPLACE"}
+RE_MODIFIED_TABLE = re.compile(
+    r"^\s*(?:(?:INSERT|REPLACE)\b.*?\bINTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)"
+    r"\s+([^\s(]+)",
+    re.IGNORECASE | re.DOTALL,
+)
+INFO_WRITTEN = "spherpro_written"
+INFO_MODIFIED = "spherpro_modified"
+
+
+def get_modified_table(statement):
+    """
+    Returns the name of the table an INSERT, UPDATE or DELETE statement
+    modifies, None if it can not be parsed.
+    """
+    m = RE_MODIFIED_TABLE.match(statement)
+    if m is None:
+        return None
+    # strip the schema and the quotes
+    return m.group(1).split(".")[-1].strip('"`[]')
+
+
+def modifies_catalog(statement):
+    """
+    Returns if a statement modifying data might modify a cached table
+    """
+    table = get_modified_table(statement)
+    return (table is None) or (table in CATALOG_TABLES)
+
+
+def watch_writes(engine, on_write, persist=None):
+    """
+    Calls on_write after every commit of a transaction that wrote to the
+    cached tables or changed the schema through the engine.
+
+    If persist returns True, transactions modifying the cached tables also
+    increment the generation in the db_generation table before they commit.
+
+    Writes bypassing sqlalchemy, e.g. by the bulk loaders, need to call
+    on_write and bump_generation themselves.
+
+    Args:
+        engine: an sqlalchemy engine
+        on_write: a function without arguments
+        persist: a function without arguments, returning if the
+            db_generation table exists
+    """
+
+    def after_cursor_execute(conn, cursor, statement, *args):
+        words = statement.split(None, 1)
+        if len(words) == 0:
+            return
+        word = words[0].upper()
+        if word in MODIFY_STATEMENTS:
+            if not modifies_catalog(statement):
+                return
+            conn.info[INFO_MODIFIED] = True
+        elif word not in SCHEMA_STATEMENTS:
+            return
+        conn.info[INFO_WRITTEN] = True
+        # bump also before the commit, e.g. for autocommit connections
+        on_write()
+
+    def commit(conn):
+        if conn.info.pop(INFO_MODIFIED, False) and (persist is not None) and persist():
+            # same transaction: other processes see the data and the
+            # new generation together
+            increment_generation(conn)
+        conn.info.pop(INFO_MODIFIED, None)
+        if conn.info.pop(INFO_WRITTEN, False):
+            on_write()
+
+    def rollback(conn):
+        conn.info.pop(INFO_WRITTEN, None)
+        conn.info.pop(INFO_MODIFIED, None)
+
+    sa.event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    sa.event.listen(engine, "commit", commit)
+    sa.event.listen(engine, "rollback", rollback)
+
+
+def increment_generation(conn):
+    """
+    Increments the generation in the db_generation table
+    within the current transaction of a connection.
+    """
+    tab = db.db_generation
+    conn.execute(
+        sa.update(tab)
+        .where(tab.generation_name == db.DB_GENERATION_NAME)
+        .values({tab.generation: tab.generation + 1})
+    )
+
+
+def bump_generation(engine):
+    """
+    Increments the generation in the db_generation table
+    in its own transaction.
+    """
+    with engine.begin() as conn:
+        increment_generation(conn)
+        # counted already
+        conn.info.pop(INFO_MODIFIED, None)
+
+
+def read_generation(engine):
+    """
+    Reads the generation from the db_generation table,
+    None if the table does not exist.
+    """
+    tab = db.db_generation
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                sa.select(tab.generation).where(
+                    tab.generation_name == db.DB_GENERATION_NAME
+                )
+            ).scalar()
+    except sa.exc.DBAPIError:
+        return None
+
+
+def _get_columns(table, joined):
+    """
+    Returns the columns of the joined tables not yet in table,
+    such that the join keys are only queried once.
+    """
+    cols = {col.key: None for col in table.__table__.columns}
+    for tab in joined:
+        for col in tab.__table__.columns:
+            cols.setdefault(col.key, col)
+    return [col for col in cols.values() if col is not None]
+
+
+def _get_join_query(session, table, joined):
+    """
+    Returns a query of all columns of table joined
+    with the tables joined, in this order.
+    """
+    query = (
+        session.query(table)
+        .add_columns(*_get_columns(table, joined))
+        .select_from(table)
+    )
+    for tab in joined:
+        query = query.join(tab)
+    return query
+
+
+def _get_key(col):
+    return getattr(col, "key", col)
+
+
+def filter_frame(dat, filters):
+    """
+    Filters a dataframe by column values.
+
+    Args:
+        dat: a dataframe
+        filters: a dict of column name: value. Lists, tuples, sets and
+            arrays select any of their values, None does not constrain.
+
+    Returns:
+        a boolean array selecting the rows
+    """
+    fil = np.ones(dat.shape[0], dtype=bool)
+    for col, value in filters.items():
+        if value is None:
+            continue
+        if col not in dat.columns:
+            raise ValueError(f"{col} is not a column of the catalog.")
+        if isinstance(value, (list, tuple, set, np.ndarray, pd.Index, pd.Series)):
+            fil &= dat[col].isin(list(value)).values
+        else:
+            fil &= (dat[col] == value).values
+    return fil
+
+
+class MetaCatalog:
+    """
+    The measurement and image metadata of a DataStore, cached in memory.
+    """
+
+    def __init__(self, datastore):
+        """
+        Args:
+            datastore: the DataStore, providing the queries, the
+                connection and the database generation
+        """
+        self.datastore = datastore
+        self._frames = dict()
+        # the engine lacking the db_generation table
+        self._unpersisted_conn = None
+        # the engine, the generation of this process and the time when
+        # the generation was last read, and the generation read
+        self._generation_read = (None, None, None, None)
+        self.loaders = {
+            MEASMETA: self._load_measmeta,
+            IMAGEMETA: self._load_imagemeta,
+        }
+
+    def invalidate(self):
+        """
+        Drops all cached tables
+        """
+        self._frames = dict()
+
+    def get_frame(self, name):
+        """
+        Returns a cached table, reloads it if the database changed since.
+
+        Writes of this process are seen immediately, writes of other
+        processes once the generation of the database is read again,
+        see read_db_generation.
+        The table is indexed by its id and must not be modified.
+        """
+        data = self.datastore
+        conn = data.db_conn
+        key = (conn, data.db_generation, self.read_db_generation())
+        cached = self._frames.get(name)
+        if (cached is None) or (cached[0] != key):
+            cached = (key, self.loaders[name]())
+            self._frames[name] = cached
+        return cached[1]
+
+    def read_db_generation(self):
+        """
+        Returns the generation of the db_generation table.
+
+        It is read again only after GENERATION_CHECK_INTERVAL seconds or
+        after this process wrote to the database, such that cached
+        lookups mostly do not query the database.
+
+        Returns:
+            the generation, None if the table does not exist
+        """
+        data = self.datastore
+        conn = data.db_conn
+        if conn is self._unpersisted_conn:
+            return None
+        key = (conn, data.db_generation)
+        conn_read, local_read, t_read, generation = self._generation_read
+        t_now = time.monotonic()
+        if ((conn_read, local_read) != key) or (
+            t_now - t_read >= GENERATION_CHECK_INTERVAL
+        ):
+            generation = read_generation(conn)
+            if generation is None:
+                self._unpersisted_conn = conn
+            self._generation_read = key + (t_now, generation)
+        return generation
+
+    def _load_frame(self, query, id_col):
+        dat = self.datastore.query_df(query)
+        dat = dat.sort_values(id_col.key, ignore_index=True)
+        dat.index = dat[id_col.key].values
+        return dat
+
+    def _load_measmeta(self):
+        query = _get_join_query(
+            self.datastore.main_session, db.measurements, MEASMETA_JOINED
+        )
+        return self._load_frame(query, db.measurements.measurement_id)
+
+    def _load_imagemeta(self):
+        query = _get_join_query(
+            self.datastore.main_session, db.images, IMAGEMETA_JOINED
+        )
+        dat = self._load_frame(query, db.images.image_id)
+        valid_ids = self.datastore.query_df(
+            self.datastore.main_session.query(db.valid_images.image_id)
+        )[db.valid_images.image_id.key]
+        dat[COL_VALID_IMAGE] = dat[db.images.image_id.key].isin(valid_ids)
+        return dat
+
+    def _get(self, name, table, columns, filters):
+        dat = self.get_frame(name)
+        cols = [col.key for col in table.__table__.columns]
+        cols += [_get_key(c) for c in columns if _get_key(c) not in cols]
+        return dat.loc[filter_frame(dat, filters), cols].reset_index(drop=True)
+
+    def get_measmeta(self, *columns, **filters):
+        """
+        Returns the measurement metadata, joined as by
+        DataStore.get_measmeta_query, from memory.
+
+        Args:
+            columns: additional columns of the joined tables, as names
+                or table columns, e.g. db.ref_stacks.scale
+            filters: column name: value(s), see filter_frame
+
+        Returns:
+            a dataframe with the measurement columns and the
+            additional columns
+        """
+        return self._get(MEASMETA, db.measurements, columns, filters)
+
+    def get_imagemeta(self, *columns, valid_images=True, **filters):
+        """
+        Returns the metadata of the images together with their
+        acquisitions, sites, slides and sampleblocks from memory.
+
+        Args:
+            columns: additional columns of the joined tables, as names
+                or table columns, e.g. db.sites.site_name
+            valid_images: only return valid images
+            filters: column name: value(s), see filter_frame
+
+        Returns:
+            a dataframe with the image columns and the additional columns
+        """
+        if valid_images:
+            filters[COL_VALID_IMAGE] = True
+        return self._get(IMAGEMETA, db.images, columns, filters)
+
+    def get_measid(self, **filters):
+        """
+        Returns the id of the measurement uniquely specified by filters.
+        """
+        measids = self.get_measmeta(**filters)[db.measurements.measurement_id.key]
+        if len(measids) != 1:
+            raise ValueError(
+                f"Measurment not uniquely specified.\n {len(measids)}"
+                f" measurements found that match specification."
+            )
+        return int(measids.iloc[0])
@@ -28,9 +28,15 @@ DEFAULT_CHANNEL_TYPE = db.ref_planes.channel_type.key
 
 BACKEND = "backend"
 BARCODE_CSV = "barcode_csv"
+CACHE_DIR = "cache_dir"
+BULKLOADER = "bulkloader"
+BULKLOADER_NATIVE = "native"
+BULKLOADER_PANDAS = "pandas"
 CHANNEL_NAME = "channel_name_col"
 CHANNEL_TYPE = "channel_type"
 CHANNEL_TYPE_DEFAULT = "IMC"
+CHUNKSIZE = "chunksize"
+PROCESSES = "processes"
 CONDITION = "condition_col"
 CPOUTPUT = "cpoutput"
 CP_DIR = "cp_dir"
@@ -44,10 +50,27 @@ IMAGENUMBER = "image_number_col"
 IMAGENUMBER_FROM = "first_image_number_col"
 IMAGENUMBER_TO = "second_image_number_col"
 IMAGES_CSV = "images_csv"
+IMPORT_REPORT = "import_report"
 LAYOUT_CSV = "layout_csv"
 MASK_FILENAME_PREFIX = "mask_filename_col_prefix"
 STACKIMG_FILENAME_PREFIX = "stackimg_filename_col_prefix"
 MEASUREMENT_CSV = "measurement_csv"
+MEASUREMENT_STORE = "measurement_store"
+MEASUREMENT_STORE_ANNDATA = "anndata"
+MEASUREMENT_STORE_COLUMNS = "columns"
+MEASUREMENT_STORE_ZARR = "zarr"
+MEASUREMENT_LAYOUT = "measurement_layout"
+COMPRESSION = "compression"
+COMPRESSION_OPTS = "compression_opts"
+SHUFFLE = "shuffle"
+CHUNK_ROWS = "chunk_rows"
+CHUNK_COLS = "chunk_cols"
+DTYPE = "dtype"
+CONTIGUOUS = "contiguous"
+MEASUREMENT_BACKUP = "measurement_backup"
+MAX_BYTES = "max_bytes"
+MAX_GENERATIONS = "max_generations"
+GRACE_PERIOD = "grace_period"
 MODNAME = "modname_col"
 MODPRE = "modpre_col"
 NAME = "name_col"
@@ -184,6 +207,39 @@ default_dict = {
         SEP: ",",
     },
     BACKEND: CON_MYSQL,
+    BULKLOADER: BULKLOADER_NATIVE,
+    # file of the import report, None: import_report.json next to the
+    # sqlite database or, for the other backends, in the working directory
+    IMPORT_REPORT: None,
+    # folder for the parquet cache of the cellprofiler output, None: no cache
+    CACHE_DIR: None,
+    # storage of the object measurements: one anndata file,
+    # a column store with one dataset per measurement or
+    # a zarr directory store with one array per measurement (requires zarr)
+    MEASUREMENT_STORE: MEASUREMENT_STORE_ANNDATA,
+    # HDF5 layout of the measurement stores
+    MEASUREMENT_LAYOUT: {
+        # codec: None, 'lzf', 'gzip' or 'blosc' (requires hdf5plugin)
+        COMPRESSION: None,
+        COMPRESSION_OPTS: None,
+        SHUFFLE: False,
+        # chunk shape of the measurement matrix, None: chosen automatically
+        CHUNK_ROWS: None,
+        CHUNK_COLS: None,
+        # 'float32' halves the size of the measurements
+        DTYPE: "float64",
+        # store X contiguously, such that it can be memory mapped,
+        # excludes compression and chunks
+        CONTIGUOUS: False,
+    },
+    # retention of the backups of the anndata measurement store,
+    # including the replaced versions, None: keep all backups
+    MEASUREMENT_BACKUP: {
+        MAX_BYTES: None,
+        MAX_GENERATIONS: None,
+        # seconds a replaced version is kept for readers still opening it
+        GRACE_PERIOD: 60,
+    },
     BARCODE_CSV: {
         PATH: None,
         BC_CSV_PLATE_NAME: "Plate",
@@ -191,7 +247,15 @@ default_dict = {
         SEP: ",",
     },
     CPOUTPUT: {
-        MEASUREMENT_CSV: {SEP: ",", FILETYPE: ".csv", DEFAULT_OBJECT: "cell"},
+        MEASUREMENT_CSV: {
+            SEP: ",",
+            FILETYPE: ".csv",
+            DEFAULT_OBJECT: "cell",
+            # rows per chunk for a streaming import, None: read all at once
+            CHUNKSIZE: None,
+            # number of object types imported in parallel worker processes
+            PROCESSES: 1,
+        },
         RELATION_CSV: {
             SEP: ",",
             OBJECTTYPE_FROM: "First Object Name",
@@ -201,6 +265,7 @@ default_dict = {
             IMAGENUMBER_FROM: "First Image Number",
             IMAGENUMBER_TO: "Second Image Number",
             RELATIONSHIP: "Relationship",
+            CHUNKSIZE: 10 ** 6,
         },
         IMAGES_CSV: {
             MASK_FILENAME_PREFIX: "ObjectsFileName_",
@@ -1,6 +1,9 @@
+import concurrent.futures
 import logging
 import os
+import pathlib
 import re
+import time
 import warnings
 
 # import numpy as np
@@ -17,8 +20,11 @@ from sqlalchemy.orm import sessionmaker
 
 import spherpro.bro as bro
 import spherpro.bromodules.io_anndata as io_anndata
+import spherpro.bulkload as bulkload
+import spherpro.catalog as catalog
 import spherpro.configuration as config
 import spherpro.db as db
+import spherpro.importreport as importreport
 import spherpro.library as lib
 
 DICT_DB_KEYS = {
@@ -38,6 +44,23 @@ OBJECTS_CHANNELTYPE = "object"
 
 READONLY = "_readonly"
 
+IMPORT_REPORT_FILENAME = "import_report.json"
+
+# marks generated metadata entries that are already in the database
+COL_EXISTING = "_existing"
+
+# how often an id reservation is retried if it collides with a
+# concurrent writer
+ID_RESERVATION_RETRIES = 10
+# seconds waited before the first retry, doubled up to the maximum
+ID_RESERVATION_BACKOFF = 0.05
+ID_RESERVATION_MAX_BACKOFF = 2.0
+# errors of a lock held by a concurrent writer: mysql lock wait timeout
+# and deadlock, postgresql deadlock, serialization failure and lock
+# not available
+LOCK_ERROR_CODES = {1205, 1213, "40P01", "40001", "55P03"}
+SQLITE_LOCKED = "database is locked"
+
 
 class DataStore(object):
     """DataStore
@@ -62,14 +85,31 @@ class DataStore(object):
         self.sphere_meta = None
         self.measurement_meta_cache = None
         self._pannel = None
+        self._db_conn = None
+        self._catalog = None
+        # bumped on every write, invalidates the catalog
+        self.db_generation = 0
+        # does the database count its generation, see catalog.watch_writes
+        self._db_generation_persisted = False
+        # does the database have the object_meta table, see _check_object_meta
+        self._has_object_meta = True
         self._session = None
         self._session_maker = None
+        self._id_reservations_ready = False
+        self.import_report = None
         self.connectors = {
             config.CON_SQLITE: db.connect_sqlite,
             config.CON_SQLITE + READONLY: db.connect_sqlite_ro,
             config.CON_MYSQL: db.connect_mysql,
             config.CON_POSTGRESQL: db.connect_postgresql,
         }
+        self.bulkloaders = {
+            config.CON_SQLITE: bulkload.load_sqlite,
+            config.CON_MYSQL: bulkload.load_mysql,
+            config.CON_POSTGRESQL: bulkload.load_postgresql,
+        }
+        # rows written and seconds spent per table
+        self.bulkload_stats = dict()
 
     #########################################################################
     #########################################################################
@@ -89,23 +129,53 @@ class DataStore(object):
         """
         self.conf = config.read_configuration(configpath)
 
-    def import_data(self, minimal=None):
+    def import_data(self, minimal=None, append=False, write_report=False):
         """read_data
         Reads the Data using the file locations given in the configfile.
         Args:
             minimal: Bool, if True, the import process only imports values from
                 the RefStacks and no location values
+            append: Bool, if True, only the images of the CP output that are
+                not yet in the database are imported and appended to the
+                existing database, see _append_db.
+            write_report: Bool, if True, the import report is written as
+                json next to the database.
+        Returns:
+            An ImportReport with the wall time, rows, rows/s and peak RSS
+            of the import stages.
         """
         if minimal is None:
             minimal = False
+        self.import_report = importreport.ImportReport(
+            count_rows=lambda: sum(s["rows"] for s in self.bulkload_stats.values())
+        )
+        report = self.import_report
         # Read the data based on the config
-        self._read_experiment_layout()
-        self._read_barcode_key()
+        if not append:
+            with report.stage("_read_experiment_layout") as stage:
+                self._read_experiment_layout()
+                stage.rows = _nrows(self.experiment_layout)
+            with report.stage("_read_barcode_key") as stage:
+                self._read_barcode_key()
+                stage.rows = _nrows(self.barcode_key)
         # self._read_measurement_data()
-        self._read_image_data()
-        self._read_relation_data()
-        self._read_stack_meta()
-        self._populate_db(minimal)
+        with report.stage("_read_image_data") as stage:
+            self._read_image_data()
+            stage.rows = _nrows(self._images_csv)
+        with report.stage("_read_stack_meta") as stage:
+            self._read_stack_meta()
+            stage.rows = _nrows(self._stack_relation_csv) + sum(
+                _nrows(d) for d in self.stack_csvs.values()
+            )
+        if append:
+            self._append_db(minimal)
+        else:
+            self._populate_db(minimal)
+        if write_report:
+            fn = get_import_report_filename(self.conf)
+            report.to_json(fn)
+            logging.info(f"Import report written to {fn}")
+        return report
 
     def resume_data(self, readonly=False):
         """read_data
@@ -126,8 +196,46 @@ class DataStore(object):
             backend += READONLY
 
         self.db_conn = self.connectors[backend](self.conf)
+        self._check_db_generation(readonly)
+        self._check_object_meta(readonly)
         self.bro = bro.Bro(self)
 
+    def _check_db_generation(self, readonly):
+        """
+        Creates the db_generation table of databases written before it
+        existed, such that other processes see the writes of this one.
+        """
+        if not readonly:
+            db.db_generation.__table__.create(self.db_conn, checkfirst=True)
+        self._db_generation_persisted = not readonly
+
+    def _check_object_meta(self, readonly):
+        """
+        Builds the object_meta table of databases written before it
+        existed, i.e. if it is missing or empty while there are objects.
+        """
+        self._has_object_meta = inspect(self.db_conn).has_table(
+            db.object_meta.__tablename__
+        )
+        if self._has_object_meta:
+            session = self.main_session
+            if (session.query(db.object_meta.object_id).first() is not None) or (
+                session.query(db.objects.object_id).first() is None
+            ):
+                return
+        if readonly:
+            warnings.warn(
+                "The database has no object_meta table yet, the validity of"
+                " the objects is queried from the valid tables, which is slower."
+                " Resume the data once with readonly=False to build it.",
+                UserWarning,
+            )
+            return
+        logging.info("Building the object_meta table")
+        db.object_meta.__table__.create(self.db_conn, checkfirst=True)
+        self._has_object_meta = True
+        self.refresh_object_meta()
+
     def drop_all(self):
         self.db_conn = self.connectors[self.conf[config.BACKEND]](self.conf)
         db.drop_all(self.db_conn)
@@ -200,41 +308,74 @@ class DataStore(object):
         else:
             self.barcode_key = None
 
-    def _read_objtype_measurements(self, object_type, chunksize):
+    def _get_objtype_measurements_filename(self, object_type):
         conf_meas = self.conf[config.CPOUTPUT][config.MEASUREMENT_CSV]
-        sep = conf_meas[config.SEP]
-        cpdir = self.conf[config.CP_DIR]
-        filetype = conf_meas[config.FILETYPE]
-        reader = pd.read_csv(
-            os.path.join(cpdir, object_type + filetype), sep=sep, chunksize=chunksize
+        return os.path.join(
+            self.conf[config.CP_DIR], object_type + conf_meas[config.FILETYPE]
+        )
+
+    def _rename_objtype_measurements(self, dat_objmeas, object_type):
+        rename_dict = {
+            self.conf[config.OBJECTNUMBER]: db.objects.object_number.key,
+            self.conf[config.IMAGENUMBER]: db.images.image_number.key,
+        }
+        dat_objmeas.rename(columns=rename_dict, inplace=True)
+        dat_objmeas[db.objects.object_type.key] = object_type
+        return dat_objmeas
+
+    def _read_objtype_measurements(self, object_type, chunksize):
+        sep = self.conf[config.CPOUTPUT][config.MEASUREMENT_CSV][config.SEP]
+        reader = lib.read_csv_cached(
+            self._get_objtype_measurements_filename(object_type),
+            sep=sep,
+            chunksize=chunksize,
+            cache_dir=self.conf[config.CACHE_DIR],
         )
 
         if chunksize is None:
             reader = [reader]
         for dat_objmeas in reader:
-            rename_dict = {
-                self.conf[config.OBJECTNUMBER]: db.objects.object_number.key,
-                self.conf[config.IMAGENUMBER]: db.images.image_number.key,
-            }
-            dat_objmeas.rename(columns=rename_dict, inplace=True)
-            dat_objmeas[db.objects.object_type.key] = object_type
-            yield dat_objmeas
+            yield self._rename_objtype_measurements(dat_objmeas, object_type)
+
+    def _read_objtype_header(self, object_type):
+        """
+        Reads only the header of the measurement file of an object type,
+        bypassing the parse cache.
+        """
+        sep = self.conf[config.CPOUTPUT][config.MEASUREMENT_CSV][config.SEP]
+        dat_header = pd.read_csv(
+            self._get_objtype_measurements_filename(object_type), sep=sep, nrows=0
+        )
+        return self._rename_objtype_measurements(dat_header, object_type)
 
     def _read_image_data(self):
         cpdir = self.conf[config.CP_DIR]
         rename_dict = {self.conf[config.IMAGENUMBER]: db.images.image_number.key}
         images_csv = lib.read_csv_from_config(
-            self.conf[config.CPOUTPUT][config.IMAGES_CSV], base_dir=cpdir
+            self.conf[config.CPOUTPUT][config.IMAGES_CSV],
+            base_dir=cpdir,
+            cache_dir=self.conf[config.CACHE_DIR],
         )
         images_csv = images_csv.rename(columns=rename_dict)
         self._images_csv = images_csv
 
     def _read_relation_data(self):
+        self._relation_csv = next(self._read_relation_chunks(chunksize=None))
+
+    def _read_relation_chunks(self, chunksize):
+        """
+        Reads the object relations in chunks of chunksize rows.
+        """
         conf_rel = self.conf[config.CPOUTPUT][config.RELATION_CSV]
         cpdir = self.conf[config.CP_DIR]
-        relation_csv = lib.read_csv_from_config(
-            self.conf[config.CPOUTPUT][config.RELATION_CSV], base_dir=cpdir
+        reader = lib.read_csv_from_config(
+            self.conf[config.CPOUTPUT][config.RELATION_CSV],
+            base_dir=cpdir,
+            chunksize=chunksize,
+            cache_dir=self.conf[config.CACHE_DIR],
         )
+        if chunksize is None:
+            reader = [reader]
         col_map = {
             conf_rel[c]: target
             for c, target in [
@@ -250,8 +391,8 @@ class DataStore(object):
                 ),
             ]
         }
-
-        self._relation_csv = relation_csv.rename(columns=col_map)
+        for relation_csv in reader:
+            yield relation_csv.rename(columns=col_map)
 
     def _read_stack_meta(self):
         """
@@ -282,20 +423,130 @@ class DataStore(object):
         self.db_conn = self.connectors[self.conf[config.BACKEND]](self.conf)
         self.drop_all()
         db.initialize_database(self.db_conn)
+        self._db_generation_persisted = True
 
         self.bro = bro.Bro(self)
-        self._write_imagemeta_tables()
-        self._write_masks_table()
-        self._write_stack_tables()
-        self._write_refplanes_table()
-        self._write_planes_table()
-        self._write_pannel_table()
-        self._write_condition_table()
-        self._write_measurement_table(minimal)
-        self._write_image_stacks_table()
-        self.reset_valid_objects()
-        self.reset_valid_images()
-        # self._write_object_relations_table()
+        self._run_stage(self._write_imagemeta_tables)
+        self._run_stage(self._write_masks_table)
+        self._run_stage(self._write_stack_tables)
+        self._run_stage(self._write_refplanes_table)
+        self._run_stage(self._write_planes_table)
+        self._run_stage(self._write_pannel_table)
+        self._run_stage(self._write_condition_table)
+        self._run_stage(self._write_measurement_table, minimal)
+        self._run_stage(self._write_image_stacks_table)
+        self._run_stage(self.reset_valid_objects)
+        self._run_stage(self.reset_valid_images)
+        self._run_stage(self.refresh_object_meta)
+        self._run_stage(self._write_object_relations_table)
+
+    def _append_db(self, minimal):
+        """
+        Appends the images of the CP output that are not yet in the database.
+
+        Images are identified by their mask filename. New images are
+        registered together with their acquisitions, sites, slides and
+        sampleblocks, if these are not registered yet, their objects
+        are appended to the anndata files and their relations are added.
+        The stacks, the pannel and the conditions are left unchanged, as
+        are the filters, debarcoding and derived measurements
+        of the existing images.
+        """
+        self.db_conn = self.connectors[self.conf[config.BACKEND]](self.conf)
+        db.initialize_database(self.db_conn)
+        self._db_generation_persisted = True
+
+        self.bro = bro.Bro(self)
+        image_numbers = self._select_new_images()
+        if len(image_numbers) == 0:
+            logging.info("No new images to import")
+            return
+        logging.info(f"Append {len(image_numbers)} new images")
+        self._run_stage(self._write_imagemeta_tables, append=True)
+        self._run_stage(self._write_masks_table)
+        self._run_stage(
+            self._write_measurement_table, minimal, image_numbers=image_numbers
+        )
+        self._run_stage(self._write_image_stacks_table)
+        self._run_stage(self._add_valid_objects, image_numbers)
+        self._run_stage(
+            self.refresh_object_meta,
+            sa.select([db.images.image_id]).where(
+                db.images.image_number.in_(image_numbers)
+            ),
+        )
+        self._run_stage(self._write_object_relations_table, image_numbers=image_numbers)
+
+    def _run_stage(self, fkt, *args, **kwargs):
+        """
+        Runs a stage of the import, timed in the import report.
+        """
+        with self.import_report.stage(fkt.__name__):
+            return fkt(*args, **kwargs)
+
+    def _select_new_images(self):
+        """
+        Restricts the images of the CP output to the ones not yet
+        in the database.
+
+        The images are matched to the database by mask filename. Image
+        numbers are used as keys throughout the import, thus existing images
+        need to keep their image number and new images need unused ones.
+
+        Returns:
+            the image numbers of the new images
+        """
+        cpconf = self.conf[config.CPOUTPUT]
+        obj = cpconf[config.MEASUREMENT_CSV][config.OBJECTS][0]
+        col_fn = cpconf[config.IMAGES_CSV][config.MASK_FILENAME_PREFIX] + obj
+        col_nr = db.images.image_number.key
+        dat_db = self.query_df(
+            self.main_session.query(db.images.image_number, db.masks.mask_filename)
+            .join(db.masks)
+            .filter(db.masks.object_type == obj)
+        )
+        dat_img = self._images_csv.loc[:, [col_nr, col_fn]].merge(
+            dat_db,
+            left_on=col_fn,
+            right_on=db.masks.mask_filename.key,
+            how="left",
+            suffixes=("", "_db"),
+        )
+        is_new = dat_img[db.masks.mask_filename.key].isnull().values
+        dat_moved = dat_img.loc[~is_new & (dat_img[col_nr] != dat_img[col_nr + "_db"])]
+        if dat_moved.shape[0] > 0:
+            raise ValueError(
+                "Image numbers of existing images changed, e.g. "
+                f"{dat_moved[col_fn].iloc[0]}: {dat_moved[col_nr + '_db'].iloc[0]}"
+                f" -> {dat_moved[col_nr].iloc[0]}"
+            )
+        image_numbers = dat_img.loc[is_new, col_nr]
+        used = image_numbers[image_numbers.isin(dat_db[col_nr])]
+        if len(used) > 0:
+            raise ValueError(
+                f"Image numbers of new images already used in the database: "
+                f"{sorted(used)[:10]}"
+            )
+        self._images_csv = self._images_csv.loc[is_new, :]
+        return set(image_numbers)
+
+    def _add_valid_objects(self, image_numbers):
+        """
+        Marks the objects of the given images as valid.
+        """
+        sel_img = sa.select([db.images.image_id]).where(
+            db.images.image_number.in_(image_numbers)
+        )
+        sel = sa.select([db.objects.object_id]).where(db.objects.image_id.in_(sel_img))
+        ins = sa.insert(db.valid_objects).from_select(
+            [db.valid_objects.object_id.key], sel
+        )
+        t_start = time.perf_counter()
+        nrows = self.main_session.execute(ins).rowcount
+        self.main_session.commit()
+        self._add_bulkload_stats(
+            db.valid_objects.__tablename__, nrows, time.perf_counter() - t_start
+        )
 
     #### Helpers ####
 
@@ -320,6 +571,7 @@ class DataStore(object):
         # write the table
         self._write_condition_table()
         session.commit()
+        self.refresh_object_conditions()
 
     ##########################################
     #        Database Table Generation:      #
@@ -623,7 +875,7 @@ class DataStore(object):
         )
         return planes
 
-    def _write_imagemeta_tables(self):
+    def _write_imagemeta_tables(self, append=False):
         """
         Write the tables containing the image metadata
         This contains:
@@ -632,6 +884,9 @@ class DataStore(object):
             - the site: the site on the slide where the acquisition ROI was made
                 -> corresponds to a panroma in the MCD
             - the slide: the physical slide
+
+        If append is True, entries that are already in the database
+        are not written again and are linked to the existing ids instead.
         """
         dat_image = self._generate_image_table()
         dat_image, dat_roi = self._generate_roi_table(dat_image)
@@ -640,6 +895,44 @@ class DataStore(object):
         dat_slideac, dat_slide = self._generate_slide_table(dat_slideac)
         dat_slide, dat_sampleblock = self._generate_sampleblock_table(dat_slide)
 
+        if append:
+            for dat_parent, dat_child, table, keys in [
+                (
+                    dat_sampleblock,
+                    dat_slide,
+                    db.sampleblocks,
+                    [db.sampleblocks.sampleblock_name],
+                ),
+                (
+                    dat_slide,
+                    dat_slideac,
+                    db.slides,
+                    [db.slides.slide_number, db.slides.sampleblock_id],
+                ),
+                (dat_slideac, dat_site, db.slideacs, [db.slideacs.slideac_name]),
+                (
+                    dat_site,
+                    dat_roi,
+                    db.sites,
+                    [db.sites.slideac_id, db.sites.site_mcd_panoramaid],
+                ),
+                (
+                    dat_roi,
+                    dat_image,
+                    db.acquisitions,
+                    [
+                        db.acquisitions.site_id,
+                        db.acquisitions.acquisition_mcd_acid,
+                        db.acquisitions.acquisition_mcd_roiid,
+                    ],
+                ),
+            ]:
+                self._link_existing(dat_parent, dat_child, table, keys)
+            dat_sampleblock, dat_slide, dat_slideac, dat_site, dat_roi = [
+                dat.loc[~dat[COL_EXISTING], :]
+                for dat in [dat_sampleblock, dat_slide, dat_slideac, dat_site, dat_roi]
+            ]
+
         self._bulkinsert(dat_sampleblock, db.sampleblocks)
         self._bulkinsert(dat_slide, db.slides)
         self._bulkinsert(dat_slideac, db.slideacs)
@@ -648,6 +941,54 @@ class DataStore(object):
         self._bulkinsert(dat_image, db.images)
         self._bulkinsert(dat_image, db.valid_images)
 
+    def _link_existing(self, dat_parent, dat_child, table, keys):
+        """
+        Links the entries of a generated metadata table to existing
+        database entries with the same keys.
+
+        The ids of the existing entries are set in dat_parent and in the
+        referencing column of dat_child, the column COL_EXISTING marks
+        the entries of dat_parent that are already in the database.
+
+        Args:
+            dat_parent: the generated table
+            dat_child: the generated table referencing dat_parent
+            table: the database table of dat_parent
+            keys: the columns identifying an entry
+        """
+        col_id = inspect(table).primary_key[0].key
+        keys = [k.key for k in keys]
+        dat_db = self.query_df(
+            self.main_session.query(*[getattr(table, c) for c in keys + [col_id]])
+        )
+        dat_db = dat_db.drop_duplicates(subset=keys)
+        dat_keys = dat_parent.loc[:, keys + [col_id]].copy()
+        for dat in [dat_keys, dat_db]:
+            for k in keys:
+                dat[k] = self._normalize_key(dat[k])
+        dat_keys = dat_keys.merge(dat_db, on=keys, how="left", suffixes=("", "_db"))
+        is_existing = dat_keys[col_id + "_db"].notnull().values
+        id_map = dict(
+            zip(
+                dat_keys.loc[is_existing, col_id],
+                dat_keys.loc[is_existing, col_id + "_db"].astype(int),
+            )
+        )
+        dat_parent[COL_EXISTING] = is_existing
+        dat_parent[col_id] = dat_parent[col_id].replace(id_map)
+        dat_child[col_id] = dat_child[col_id].replace(id_map)
+
+    @staticmethod
+    def _normalize_key(values):
+        """
+        Converts key values to a comparable representation, as keys parsed
+        from filenames are strings while they can be numbers in the database.
+        """
+        numeric = pd.to_numeric(values, errors="coerce")
+        if numeric.notnull().sum() == values.notnull().sum():
+            return numeric.astype(float)
+        return values.map(lambda x: None if pd.isnull(x) else str(x))
+
     def _generate_image_table(self):
         """
         Generates the slide, site and roi metadata from the filenames or ome folders.
@@ -921,19 +1262,125 @@ class DataStore(object):
         )
         return objects
 
-    def _write_measurement_table(self, minimal):
+    def _write_measurement_table(self, minimal, image_numbers=None):
         """
         Generates the Measurement, MeasurementType and MeasurementName
         tables and writes them to an anndata object.
 
+        If image_numbers are given, only the objects of these images
+        are appended to the existing anndata objects.
         """
         if self.conf[config.BACKEND] == config.CON_SQLITE:
-            for obj_type, meas in self._generate_anndata_measurements():
-                ioan = io_anndata.IoAnnData(self.bro, obj_type)
-                ioan.initialize_anndata(meas)
+            conf_meas = self.conf[config.CPOUTPUT][config.MEASUREMENT_CSV]
+            chunksize = conf_meas[config.CHUNKSIZE]
+            processes = conf_meas[config.PROCESSES]
+            if image_numbers is not None:
+                for obj_type in conf_meas[config.OBJECTS]:
+                    self._append_anndata_measurements(
+                        obj_type, chunksize, image_numbers
+                    )
+            elif processes > 1 and len(conf_meas[config.OBJECTS]) > 1:
+                self._write_anndata_measurements_parallel(
+                    conf_meas[config.OBJECTS], processes, chunksize
+                )
+            elif chunksize is None:
+                for obj_type, meas in self._generate_anndata_measurements():
+                    ioan = io_anndata.get_measurement_store(self.bro, obj_type)
+                    ioan.initialize_anndata(meas)
+            else:
+                for obj_type in conf_meas[config.OBJECTS]:
+                    self._write_anndata_measurements_chunked(obj_type, chunksize)
+
+    def _write_anndata_measurements_chunked(self, obj_type, chunksize):
+        """
+        Streams the measurements of an object type in chunks
+        into an anndata object.
+
+        The objects are registered chunk by chunk and the values are
+        appended to the on disk matrix, thus the peak memory depends on the
+        chunksize and not on the size of the dataset.
+        """
+        logging.debug(f"Read {obj_type} in chunks of {chunksize}:")
+        reader = self._read_objtype_measurements(obj_type, chunksize=chunksize)
+        dat_meas = next(reader)
+        logging.debug("Register measurements:")
+        dat_measmeta = self._register_measurement_meta(dat_meas)
+        dat_measmeta = dat_measmeta.sort_values(db.measurements.measurement_id.key)
+        var = pd.DataFrame(
+            index=dat_measmeta[db.measurements.measurement_id.key].map(str).values
+        )
+
+        def chunks(dat_meas):
+            yield self._convert_anndata_measurements(dat_meas, dat_measmeta)
+            for dat_meas in reader:
+                yield self._convert_anndata_measurements(dat_meas, dat_measmeta)
+
+        ioan = io_anndata.get_measurement_store(self.bro, obj_type)
+        ioan.initialize_anndata_chunked(chunks(dat_meas), var)
+
+    def _append_anndata_measurements(self, obj_type, chunksize, image_numbers):
+        """
+        Appends the measurements of the objects in the given images
+        to the anndata object of an object type.
+        """
+        logging.debug(f"Append {obj_type}:")
+        reader = self._read_objtype_measurements(obj_type, chunksize=chunksize)
+
+        def chunks():
+            dat_measmeta = None
+            for dat_meas in reader:
+                fil = dat_meas[db.images.image_number.key].isin(image_numbers)
+                if not fil.any():
+                    continue
+                dat_meas = dat_meas.loc[fil, :]
+                if dat_measmeta is None:
+                    logging.debug("Register measurements:")
+                    dat_measmeta = self._register_measurement_meta(dat_meas)
+                yield self._convert_anndata_measurements(dat_meas, dat_measmeta)
+
+        ioan = io_anndata.get_measurement_store(self.bro, obj_type)
+        ioan.append_anndata_chunked(chunks())
+
+    def _write_anndata_measurements_parallel(self, obj_types, processes, chunksize):
+        """
+        Imports the object types in parallel worker processes.
+
+        The measurements are registered in the main process, the workers
+        parse the measurement files, reserve the object ids and write the
+        anndata files. The object tables returned by the workers are
+        inserted by the main process.
+        """
+        dat_measmetas = {}
+        for obj_type in obj_types:
+            # only the header: the workers build the parse caches in parallel
+            dat_header = self._read_objtype_header(obj_type)
+            logging.debug(f"Register measurements of {obj_type}:")
+            dat_measmetas[obj_type] = self._register_measurement_meta(dat_header)
+        img_dict = {
+            n: i
+            for n, i in self.main_session.query(
+                db.images.image_number, db.images.image_id
+            )
+        }
+        self.main_session.commit()
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            futures = {
+                pool.submit(
+                    _write_anndata_objtype,
+                    self.conf,
+                    obj_type,
+                    dat_measmetas[obj_type],
+                    img_dict,
+                    chunksize,
+                ): obj_type
+                for obj_type in obj_types
+            }
+            for future in concurrent.futures.as_completed(futures):
+                logging.debug(f"Register objects of {futures[future]}:")
+                self._bulkinsert(future.result(), db.objects)
 
     def _register_measurement_meta(self, dat_meas):
-        meas_cols = list(
+        meas_cols = sorted(
             set(dat_meas.columns)
             - {
                 db.objects.object_type.key,
@@ -942,13 +1389,11 @@ class DataStore(object):
                 db.objects.object_id.key,
             }
         )
-        meta = pd.Series(meas_cols).apply(
-            lambda x: lib.find_measurementmeta(
-                self._stacks,
-                x,
-                no_stack_str=OBJECTS_STACKNAME,
-                no_plane_string=OBJECTS_PLANEID,
-            )
+        meta = lib.find_measurementmetas(
+            self._stacks,
+            meas_cols,
+            no_stack_str=OBJECTS_STACKNAME,
+            no_plane_string=OBJECTS_PLANEID,
         )
         meta.columns = [
             "variable",
@@ -985,8 +1430,10 @@ class DataStore(object):
             db.images.image_number.key,
         ]
         dat_objmeta = dat_meas.loc[:, obj_metavars]
+        # object_meta is rebuilt once after all objects are imported,
+        # see _populate_db and _append_db
         dat_objmeta = self.bro.processing.measurement_maker.register_objects(
-            dat_objmeta, assume_new=True
+            dat_objmeta, assume_new=True, refresh_meta=False
         )
         return dat_objmeta
 
@@ -1003,26 +1450,51 @@ class DataStore(object):
             # register the measurements
             logging.debug("Register measurements:")
             dat_measmeta = self._register_measurement_meta(dat_meas)
-            logging.debug("Register objects:")
-            # register the objects
-            # -> This adds objectid to the table
-            dat_objmeta = self._register_objects(dat_meas)
-            dat_meas = dat_meas.merge(dat_objmeta)
-            # set the object_id as index
-            dat_meas.set_index(db.objects.object_id.key, inplace=True)
-            dat_meas.drop(columns=dat_objmeta.columns, errors="ignore", inplace=True)
-            variables = dat_measmeta["variable"]
-            dat_meas = dat_meas.loc[:, variables].rename(
-                columns={
-                    v: int(i)
-                    for v, i in zip(
-                        dat_measmeta["variable"],
-                        dat_measmeta[db.measurements.measurement_id.key],
-                    )
-                }
-            )
+            dat_meas = self._convert_anndata_measurements(dat_meas, dat_measmeta)
             yield obj_type, dat_meas
 
+    def _convert_anndata_measurements(self, dat_meas, dat_measmeta):
+        """
+        Registers the objects of a measurement table and converts it to
+        a table with the object_id as index and the measurement_id as columns.
+        """
+        logging.debug("Register objects:")
+        # register the objects
+        # -> This adds objectid to the table
+        dat_objmeta = self._register_objects(dat_meas)
+        return self._index_anndata_measurements(
+            dat_meas, dat_measmeta, dat_objmeta[db.objects.object_id.key].values
+        )
+
+    @staticmethod
+    def _index_anndata_measurements(dat_meas, dat_measmeta, object_ids):
+        """
+        Converts a measurement table to a table with the object_ids as index
+        and the measurement_ids as columns.
+
+        Args:
+            dat_meas: the measurement table
+            dat_measmeta: the registered measurement meta
+            object_ids: the object_ids, in the same row order as dat_meas
+        """
+        variables = dat_measmeta["variable"]
+        dat_meas = dat_meas.loc[:, variables].rename(
+            columns={
+                v: int(i)
+                for v, i in zip(
+                    dat_measmeta["variable"],
+                    dat_measmeta[db.measurements.measurement_id.key],
+                )
+            }
+        )
+        # set the object_id as index
+        # -> the object metadata is in the same row order as the measurements
+        dat_meas.index = pd.Index(
+            np.asarray(object_ids).astype(int),
+            name=db.objects.object_id.key,
+        )
+        return dat_meas
+
     def _generate_measurements(self, minimal, chuncksize=3000, longform=True):
         conf_meas = self.conf[config.CPOUTPUT][config.MEASUREMENT_CSV]
         for obj_type in conf_meas[config.OBJECTS]:
@@ -1065,11 +1537,20 @@ class DataStore(object):
                 logging.debug("Start uploading")
                 yield measurements
 
-    def _generate_object_relation_types(self):
-        dat_relations = self._relation_csv
-        dat_types = pd.DataFrame(
-            dat_relations.loc[:, db.object_relation_types.object_relationtype_name.key]
-        ).drop_duplicates()
+    def _generate_object_relation_types(self, dat_relations):
+        """
+        Generates the relation types of a relation table that are not
+        registered yet.
+        """
+        col_name = db.object_relation_types.object_relationtype_name.key
+        existing = {
+            n
+            for (n,) in self.main_session.query(
+                db.object_relation_types.object_relationtype_name
+            )
+        }
+        dat_types = pd.DataFrame(dat_relations.loc[:, col_name]).drop_duplicates()
+        dat_types = dat_types.loc[~dat_types[col_name].isin(existing), :]
         dat_types[
             db.object_relation_types.object_relationtype_id.key
         ] = self._query_new_ids(
@@ -1077,15 +1558,62 @@ class DataStore(object):
         )
         return dat_types
 
-    def _generate_object_relations(self):
-        logging.debug("Start img_dict")
-        img_dict = {
-            n: i
-            for n, i in self.main_session.query(
-                db.images.image_number, db.images.image_id
+    def _generate_object_index(self):
+        """
+        Precomputes an integer index to map (image_number, object_number)
+        to object_ids for every object type.
+
+        Returns:
+            a dict object_type: (sorted integer keys, object_ids) and
+            the factor used to compute the keys:
+                key = image_number * factor + object_number
+        """
+        dat_obj = self.query_df(
+            self.main_session.query(
+                db.images.image_number,
+                db.objects.object_number,
+                db.objects.object_type,
+                db.objects.object_id,
+            ).join(db.images)
+        )
+        obj_index = {}
+        if dat_obj.shape[0] == 0:
+            return obj_index, 1
+        factor = int(dat_obj[db.objects.object_number.key].max()) + 1
+        for obj_type, dat in dat_obj.groupby(db.objects.object_type.key):
+            keys = (
+                dat[db.images.image_number.key].values.astype(np.int64) * factor
+                + dat[db.objects.object_number.key].values
             )
-        }
-        logging.debug("Start relation_dict")
+            order = np.argsort(keys)
+            obj_index[obj_type] = (
+                keys[order],
+                dat[db.objects.object_id.key].values[order],
+            )
+        return obj_index, factor
+
+    @staticmethod
+    def _map_object_ids(obj_index, factor, image_numbers, object_numbers, object_types):
+        """
+        Maps objects to object_ids using the index from _generate_object_index.
+        Objects not in the index are mapped to -1.
+        """
+        image_numbers = np.asarray(image_numbers, dtype=np.int64)
+        object_numbers = np.asarray(object_numbers, dtype=np.int64)
+        object_types = np.asarray(object_types)
+        object_ids = np.full(len(object_numbers), -1, dtype=np.int64)
+        for obj_type, (keys, ids) in obj_index.items():
+            fil = (object_types == obj_type) & (object_numbers < factor)
+            objkeys = image_numbers[fil] * factor + object_numbers[fil]
+            pos = np.minimum(np.searchsorted(keys, objkeys), len(keys) - 1)
+            object_ids[fil] = np.where(keys[pos] == objkeys, ids[pos], -1)
+        return object_ids
+
+    def _generate_object_relations(self, dat_relations, obj_index, factor):
+        """
+        Maps the objects of a relation table to their object_ids.
+        Relations of objects that are not registered are dropped.
+        """
         relation_dict = {
             n: i
             for n, i in self.main_session.query(
@@ -1093,41 +1621,54 @@ class DataStore(object):
                 db.object_relation_types.object_relationtype_id,
             )
         }
-        logging.debug("Start obj dict")
-        obj_dict = {
-            (imgid, objnr, objtype): objid
-            for imgid, objnr, objtype, objid in self.main_session.query(
-                db.objects.image_id,
-                db.objects.object_number,
-                db.objects.object_type,
-                db.objects.object_id,
-            ).all()
-        }
-        logging.debug("End obj dict")
-
-        dat_relations = self._relation_csv
-        logging.debug("Start replacing objfrom")
-        dat_relations["timg"] = dat_relations[config.IMAGENUMBER_FROM].replace(img_dict)
-        dat_relations[db.object_relations.object_id_parent.key] = dat_relations.loc[
-            :, ["timg", config.OBJECTNUMBER_FROM, config.OBJECTTYPE_FROM]
-        ].apply(lambda x: obj_dict.get((x[0], x[1], x[2])), axis=1)
-        logging.debug("Start replacing ids objto")
-        dat_relations["timg"] = dat_relations[config.IMAGENUMBER_TO].replace(img_dict)
-        dat_relations[db.object_relations.object_id_child.key] = dat_relations.loc[
-            :, ["timg", config.OBJECTNUMBER_TO, config.OBJECTTYPE_TO]
-        ].apply(lambda x: obj_dict.get((x[0], x[1], x[2])), axis=1)
-        dat_relations[db.object_relations.object_relationtype_id.key] = dat_relations[
+        col_parent = db.object_relations.object_id_parent.key
+        col_child = db.object_relations.object_id_child.key
+        col_type = db.object_relations.object_relationtype_id.key
+        dat_relations[col_parent] = self._map_object_ids(
+            obj_index,
+            factor,
+            dat_relations[config.IMAGENUMBER_FROM],
+            dat_relations[config.OBJECTNUMBER_FROM],
+            dat_relations[config.OBJECTTYPE_FROM],
+        )
+        dat_relations[col_child] = self._map_object_ids(
+            obj_index,
+            factor,
+            dat_relations[config.IMAGENUMBER_TO],
+            dat_relations[config.OBJECTNUMBER_TO],
+            dat_relations[config.OBJECTTYPE_TO],
+        )
+        dat_relations[col_type] = dat_relations[
             db.object_relation_types.object_relationtype_name.key
-        ].replace(relation_dict)
-        return dat_relations
+        ].map(relation_dict)
+        fil = (dat_relations[col_parent] >= 0) & (dat_relations[col_child] >= 0)
+        dat_relations = dat_relations.loc[fil, [col_parent, col_child, col_type]]
+        return dat_relations.drop_duplicates()
 
-    def _write_object_relations_table(self):
-        logging.debug("start generate object_relation_types")
-        relation_types = self._generate_object_relation_types()
-        self._bulkinsert(relation_types, db.object_relation_types)
-        logging.debug("start generate object_relations")
-        relations = self._generate_object_relations()
-        self._bulkinsert(relations, db.object_relations)
+    def _write_object_relations_table(self, image_numbers=None):
+        """
+        Streams the object relations in chunks into the database.
+
+        If image_numbers are given, only relations involving objects
+        of these images are written.
+        """
+        conf_rel = self.conf[config.CPOUTPUT][config.RELATION_CSV]
+        logging.debug("start generate object index")
+        obj_index, factor = self._generate_object_index()
+        for dat_relations in self._read_relation_chunks(conf_rel[config.CHUNKSIZE]):
+            if image_numbers is not None:
+                fil = dat_relations[config.IMAGENUMBER_FROM].isin(
+                    image_numbers
+                ) | dat_relations[config.IMAGENUMBER_TO].isin(image_numbers)
+                dat_relations = dat_relations.loc[fil, :]
+            logging.debug("start generate object_relation_types")
+            relation_types = self._generate_object_relation_types(dat_relations)
+            self._bulkinsert(relation_types, db.object_relation_types)
+            logging.debug("start generate object_relations")
+            relations = self._generate_object_relations(
+                dat_relations, obj_index, factor
+            )
+            self._bulkinsert(relations, db.object_relations)
 
     def _write_pannel_table(self):
         pannel = self._generate_pannel_table()
@@ -1223,32 +1764,66 @@ class DataStore(object):
 
     def _query_new_ids(self, id_col, n):
         """
-        Queries non used id's from the database
+        Reserves a block of unused id's from the database
+
+        The block is reserved in the id_reservations table in its own
+        transaction, thus concurrent writers never receive
+        overlapping id's.
+
         Args:
             id_col: a sqlalchemy column object corresponding
                 to a column in a table
             n: how many id's are requested
-        """
-        if self.conf[config.BACKEND] == config.CON_POSTGRESQL:
+
+        Returns:
+            A range of n new id's
+        """
+        if n == 0:
+            return range(1, 1)
+        if not self._id_reservations_ready:
+            db.id_reservations.__table__.create(self.db_conn, checkfirst=True)
+            self._id_reservations_ready = True
+        id_name = str(id_col)
+        tab = db.id_reservations
+        for attempt in range(ID_RESERVATION_RETRIES):
+            if attempt > 0:
+                time.sleep(
+                    min(
+                        ID_RESERVATION_BACKOFF * 2 ** (attempt - 1),
+                        ID_RESERVATION_MAX_BACKOFF,
+                    )
+                )
             session = self.session_maker()
-            str_seq = str(id_col).replace(".", "_") + "_seq"
-            # this will instantiate the sequence if it is not
-            # done so yet
-            # otherwise it will lead to a gap of 1 between the ids
-            # which should not matter
-            _ = session.execute(sa.schema.Sequence(str_seq))
-
-            session.execute("ALTER SEQUENCE " + str_seq + " INCREMENT " + str(n))
-            i = session.execute(sa.schema.Sequence(str_seq))
-            session.execute("ALTER SEQUENCE " + str_seq + " INCREMENT " + str(1))
-            session.commit()
-            return range(i - n + 1, i + 1)
-        else:
-            # self.main_session.query(func
-            prev_max = self.main_session.query(sa.func.max(id_col)).scalar()
-            if prev_max is None:
-                prev_max = 0
-            return range(prev_max + 1, prev_max + n + 1)
+            try:
+                updated = session.execute(
+                    sa.update(tab)
+                    .where(tab.id_name == id_name)
+                    .values({tab.next_id: tab.next_id + n})
+                ).rowcount
+                if updated == 0:
+                    # first reservation: start after the current maximum
+                    prev_max = session.query(sa.func.max(id_col)).scalar()
+                    start = (prev_max or 0) + 1
+                    session.add(tab(id_name=id_name, next_id=start + n))
+                else:
+                    start = (
+                        session.query(tab.next_id)
+                        .filter(tab.id_name == id_name)
+                        .scalar()
+                        - n
+                    )
+                session.commit()
+                return range(start, start + n)
+            except (sa.exc.IntegrityError, sa.exc.OperationalError) as e:
+                session.rollback()
+                # retry only if another writer initialized the reservation
+                # or holds the lock
+                if not (isinstance(e, sa.exc.IntegrityError) or _is_lock_error(e)):
+                    raise
+                logging.debug(f"Retrying id reservation for {id_name}: {e}")
+            finally:
+                session.close()
+        raise ValueError(f"Could not reserve {n} ids for {id_name}")
 
     #########################################################################
     #########################################################################
@@ -1280,16 +1855,26 @@ class DataStore(object):
 
         logging.debug("Insert table of dimension: " + str(data.shape))
         data = self._clean_columns(data, table)
-        data.to_sql(
-            dbtable,
-            self.db_conn,
-            if_exists="append",
-            index=False,
-            method="multi",
-            chunksize=999,
-        )
+        loader = self.bulkloader
+        t_start = time.perf_counter()
+        nrows = loader(data, table, self.db_conn)
+        t_used = time.perf_counter() - t_start
         # odo(data, dbtable)
         self.main_session.commit()
+        # the native loaders write past sqlalchemy
+        if dbtable in catalog.CATALOG_TABLES:
+            self.bump_db_generation()
+
+        self._add_bulkload_stats(dbtable, nrows, t_used)
+        logging.info(
+            f"Inserted {nrows} rows into {dbtable} using {loader.__name__}:"
+            f" {nrows / max(t_used, 1e-9):.0f} rows/s"
+        )
+
+    def _add_bulkload_stats(self, dbtable, nrows, seconds):
+        stats = self.bulkload_stats.setdefault(dbtable, {"rows": 0, "seconds": 0.0})
+        stats["rows"] += nrows
+        stats["seconds"] += seconds
 
     def _clean_columns(self, data, table):
         """
@@ -1387,8 +1972,13 @@ class DataStore(object):
         ins = sa.insert(db.valid_images).from_select(
             [db.valid_images.image_id.key], sel
         )
-        self.main_session.execute(ins)
+        t_start = time.perf_counter()
+        nrows = self.main_session.execute(ins).rowcount
         self.main_session.commit()
+        self._add_bulkload_stats(
+            db.valid_images.__tablename__, nrows, time.perf_counter() - t_start
+        )
+        self.refresh_object_validity()
 
     def reset_valid_objects(self):
         sel = sa.select([db.objects.object_id]).where(
@@ -1399,8 +1989,107 @@ class DataStore(object):
         ins = sa.insert(db.valid_objects).from_select(
             [db.valid_objects.object_id.key], sel
         )
-        self.main_session.execute(ins)
+        t_start = time.perf_counter()
+        nrows = self.main_session.execute(ins).rowcount
         self.main_session.commit()
+        self._add_bulkload_stats(
+            db.valid_objects.__tablename__, nrows, time.perf_counter() - t_start
+        )
+        self.refresh_object_validity()
+
+    def refresh_object_meta(self, image_ids=None):
+        """
+        Rebuilds the denormalized object_meta table from the objects,
+        images, acquisitions, sites, slides, sampleblocks and the
+        valid objects and images.
+
+        Args:
+            image_ids: only rebuild the objects of these images, as a list
+                or a select of image ids. None: rebuild all objects.
+        """
+        tab = db.object_meta
+        delete = sa.delete(tab).execution_options(synchronize_session=False)
+        if image_ids is not None:
+            delete = delete.where(tab.image_id.in_(image_ids))
+        sel = (
+            sa.select(
+                [
+                    db.objects.object_id,
+                    db.objects.object_number,
+                    db.objects.object_type,
+                    db.objects.image_id,
+                    db.images.acquisition_id,
+                    db.acquisitions.site_id,
+                    db.sites.slideac_id,
+                    db.slideacs.slide_id,
+                    db.slides.sampleblock_id,
+                    db.images.condition_id,
+                    db.objects.object_id.in_(sa.select([db.valid_objects.object_id])),
+                    db.objects.image_id.in_(sa.select([db.valid_images.image_id])),
+                ]
+            )
+            .select_from(db.objects)
+            .join(db.images)
+            .join(db.acquisitions)
+            .join(db.sites)
+            .join(db.slideacs)
+            .join(db.slides)
+            .join(db.sampleblocks)
+        )
+        if image_ids is not None:
+            sel = sel.where(db.objects.image_id.in_(image_ids))
+        ins = sa.insert(tab).from_select([c.key for c in tab.__table__.columns], sel)
+        t_start = time.perf_counter()
+        self.main_session.execute(delete)
+        nrows = self.main_session.execute(ins).rowcount
+        self.main_session.commit()
+        self._add_bulkload_stats(
+            tab.__tablename__, nrows, time.perf_counter() - t_start
+        )
+
+    def refresh_object_validity(self):
+        """
+        Updates the validity flags of object_meta from the
+        valid objects and images.
+        """
+        tab = db.object_meta
+        self._update_object_meta(
+            {
+                tab.valid_object: tab.object_id.in_(
+                    sa.select([db.valid_objects.object_id])
+                ),
+                tab.valid_image: tab.image_id.in_(
+                    sa.select([db.valid_images.image_id])
+                ),
+            }
+        )
+
+    def refresh_object_conditions(self):
+        """
+        Updates the conditions of object_meta from the images,
+        e.g. after debarcoding.
+        """
+        tab = db.object_meta
+        self._update_object_meta(
+            {
+                tab.condition_id: sa.select([db.images.condition_id])
+                .where(db.images.image_id == tab.image_id)
+                .scalar_subquery()
+            }
+        )
+
+    def _update_object_meta(self, values):
+        upd = (
+            sa.update(db.object_meta)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        t_start = time.perf_counter()
+        nrows = self.main_session.execute(upd).rowcount
+        self.main_session.commit()
+        self._add_bulkload_stats(
+            db.object_meta.__tablename__, nrows, time.perf_counter() - t_start
+        )
 
     #########################################################################
     #########################################################################
@@ -1430,13 +2119,26 @@ class DataStore(object):
         """
         Returns a query object that queries table with the most important
         information do identify an object.
+
+        The objects are joined with their images, acquisitions, sites,
+        slideacs, slides and sampleblocks, such that their columns can be
+        used to filter, and with the denormalized object_meta table, whose
+        validity flags replace the joins with the valid tables.
+        Objects without an object_meta row, e.g. written past
+        register_objects, are checked against the valid tables instead.
         """
         if session is None:
             session = self.main_session
 
+        valid_object = db.objects.object_id.in_(sa.select([db.valid_objects.object_id]))
+        valid_image = db.objects.image_id.in_(sa.select([db.valid_images.image_id]))
+        query = session.query(db.objects)
+        if self._has_object_meta:
+            query = query.outerjoin(db.object_meta)
+            valid_object = sa.func.coalesce(db.object_meta.valid_object, valid_object)
+            valid_image = sa.func.coalesce(db.object_meta.valid_image, valid_image)
         query = (
-            session.query(db.objects)
-            .join(db.images)
+            query.join(db.images, db.objects.image_id == db.images.image_id)
             .join(db.acquisitions)
             .join(db.sites)
             .join(db.slideacs)
@@ -1445,9 +2147,9 @@ class DataStore(object):
         )
 
         if valid_objects:
-            query = query.join(db.valid_objects)
+            query = query.filter(valid_object)
         if valid_images:
-            query = query.join(db.valid_images)
+            query = query.filter(valid_image)
         return query
 
     def _get_namekey_dict(self, namecol, idcol, names):
@@ -1468,7 +2170,49 @@ class DataStore(object):
         }
         return d
 
+    def bump_db_generation(self):
+        """
+        Marks the database as changed, such that cached metadata is
+        reloaded, also by other processes.
+
+        Needed after writes to the catalog.CATALOG_TABLES bypassing
+        sqlalchemy, e.g. by the bulk loaders, the other writes are
+        tracked by catalog.watch_writes.
+        """
+        if self._db_generation_persisted:
+            # counted by _on_db_write as well
+            catalog.bump_generation(self.db_conn)
+        else:
+            self._on_db_write()
+
+    def _on_db_write(self):
+        self.db_generation += 1
+
     # Properties:
+    @property
+    def db_conn(self):
+        """
+        The sqlalchemy engine of the database
+        """
+        return self._db_conn
+
+    @db_conn.setter
+    def db_conn(self, engine):
+        catalog.watch_writes(
+            engine, self._on_db_write, lambda: self._db_generation_persisted
+        )
+        self._db_conn = engine
+
+    @property
+    def catalog(self):
+        """
+        The measurement and image metadata cached in memory,
+        see catalog.MetaCatalog
+        """
+        if self._catalog is None:
+            self._catalog = catalog.MetaCatalog(self)
+        return self._catalog
+
     @property
     def pannel(self):
         if self._pannel is None:
@@ -1494,6 +2238,18 @@ class DataStore(object):
         stacks += [s for s in [st for st in self.stack_csvs]]
         return set(stacks)
 
+    @property
+    def bulkloader(self):
+        """
+        Returns the bulk loader for the configured backend.
+
+        The generic pandas loader is used if 'bulkloader' is
+        set to 'pandas' in the configuration.
+        """
+        if self.conf[config.BULKLOADER] == config.BULKLOADER_PANDAS:
+            return bulkload.load_pandas
+        return self.bulkloaders.get(self.conf[config.BACKEND], bulkload.load_pandas)
+
     @property
     def session_maker(self):
         """
@@ -1524,3 +2280,87 @@ class DataStore(object):
 
         """
         return pd.read_sql(query.statement, self.db_conn)
+
+
+def get_import_report_filename(conf):
+    """
+    Returns the file of the import report: the configured one, by default
+    the import report is stored next to the sqlite database or, for the
+    other backends, in the working directory.
+    """
+    fn = conf.get(config.IMPORT_REPORT)
+    if fn is not None:
+        return pathlib.Path(fn)
+    if conf.get(config.BACKEND) == config.CON_SQLITE:
+        return (
+            pathlib.Path(conf[config.CON_SQLITE]["db"]).parent / IMPORT_REPORT_FILENAME
+        )
+    return pathlib.Path(IMPORT_REPORT_FILENAME)
+
+
+def _is_lock_error(exc):
+    """
+    Checks if a database error is caused by a lock held by
+    a concurrent writer.
+    """
+    orig = getattr(exc, "orig", None)
+    if orig is None:
+        return False
+    code = getattr(orig, "pgcode", None)
+    if (code is None) and (len(orig.args) > 0):
+        code = orig.args[0]
+    return (code in LOCK_ERROR_CODES) or (SQLITE_LOCKED in str(orig))
+
+
+def _nrows(dat):
+    return 0 if dat is None else dat.shape[0]
+
+
+def _write_anndata_objtype(conf, obj_type, dat_measmeta, img_dict, chunksize):
+    """
+    Worker of DataStore._write_anndata_measurements_parallel.
+
+    Parses the measurements of one object type, reserves the object ids
+    and writes the anndata file.
+
+    Args:
+        conf: the configuration dictionary
+        obj_type: the object type to import
+        dat_measmeta: the registered measurement meta of the object type
+        img_dict: a dict image_number: image_id
+        chunksize: rows per chunk, None to read the whole file at once
+
+    Returns:
+        The object table to be inserted into the database
+    """
+    store = DataStore()
+    store.conf = conf
+    store.db_conn = store.connectors[conf[config.BACKEND]](conf)
+    obj_metavars = [
+        db.objects.object_number.key,
+        db.objects.object_type.key,
+        db.images.image_number.key,
+    ]
+    dat_measmeta = dat_measmeta.sort_values(db.measurements.measurement_id.key)
+    var = pd.DataFrame(
+        index=dat_measmeta[db.measurements.measurement_id.key].map(str).values
+    )
+    dat_objmetas = []
+    with io_anndata.get_measurement_writer(conf, obj_type, var) as writer:
+        for dat_meas in store._read_objtype_measurements(obj_type, chunksize):
+            dat_objmeta = dat_meas.loc[:, obj_metavars].copy()
+            dat_objmeta[db.objects.image_id.key] = dat_objmeta[
+                db.images.image_number.key
+            ].map(img_dict)
+            dat_objmeta[db.objects.object_id.key] = store._query_new_ids(
+                db.objects.object_id, dat_objmeta.shape[0]
+            )
+            dat_meas = store._index_anndata_measurements(
+                dat_meas, dat_measmeta, dat_objmeta[db.objects.object_id.key]
+            )
+            writer.append(dat_meas.rename(columns=str))
+            dat_objmetas.append(dat_objmeta)
+    store.db_conn.dispose()
+    if len(dat_objmetas) == 0:
+        return pd.DataFrame(columns=obj_metavars + [db.objects.image_id.key])
+    return pd.concat(dat_objmetas, ignore_index=True)
@@ -9,7 +9,7 @@ from sqlalchemy import (
     ForeignKeyConstraint,
     UniqueConstraint,
 )
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, insert
 from sqlalchemy.ext.declarative import declarative_base
 import sqlite3
 
@@ -71,7 +71,13 @@ def connect_mysql(conf):
     password = conf["mysql"]["pass"]
     database = conf["mysql"]["db"]
     conn = "mysql+pymysql://%s:%s@%s:%s/%s" % (user, password, host, port, database)
-    engine = create_engine(conn)
+    connect_args = {}
+    # local_infile is required for bulk loading with LOAD DATA LOCAL INFILE,
+    # only enabled if the native bulk loader is used
+    # (configuration.BULKLOADER, not imported to avoid a circular import)
+    if conf.get("bulkloader", "native") == "native":
+        connect_args["local_infile"] = True
+    engine = create_engine(conn, connect_args=connect_args)
     return engine
 
 
@@ -498,3 +504,66 @@ class valid_objects(Base):
     __tablename__ = "valid_objects"
     object_id = Column(Integer(), primary_key=True)
     __table_args__ = (ForeignKeyConstraint([object_id], [objects.object_id]), {})
+
+
+class id_reservations(Base):
+    """
+    Holds the next free id per id column. Blocks of ids are reserved
+    by atomically incrementing next_id, which allows several processes
+    to write to the same database.
+    """
+
+    __tablename__ = "id_reservations"
+    id_name = Column(String(200), primary_key=True)
+    next_id = Column(Integer())
+
+
+class object_meta(Base):
+    """
+    Denormalized metadata of the objects: the keys of the image,
+    acquisition, site, slide, sampleblock and condition of every object
+    together with its validity flags.
+
+    Derived from the normalized tables and maintained by the DataStore,
+    see DataStore.refresh_object_meta. Code writing to the objects, images
+    or valid tables directly needs to refresh it.
+    """
+
+    __tablename__ = "object_meta"
+    object_id = Column(Integer(), primary_key=True)
+    object_number = Column(Integer())
+    object_type = Column(String(200), index=True)
+    image_id = Column(Integer(), index=True)
+    acquisition_id = Column(Integer())
+    site_id = Column(Integer())
+    slideac_id = Column(Integer())
+    slide_id = Column(Integer())
+    sampleblock_id = Column(Integer(), index=True)
+    condition_id = Column(Integer(), index=True)
+    valid_object = Column(Boolean())
+    valid_image = Column(Boolean())
+    __table_args__ = (ForeignKeyConstraint([object_id], [objects.object_id]), {})
+
+
+class db_generation(Base):
+    """
+    Counts the transactions that modified the database, such that
+    processes caching data can detect changes made by others with a
+    single row read, see catalog.MetaCatalog.
+
+    Holds a single row, inserted when the table is created.
+    """
+
+    __tablename__ = "db_generation"
+    generation_name = Column(String(200), primary_key=True)
+    generation = Column(Integer())
+
+
+DB_GENERATION_NAME = "database"
+
+
+@event.listens_for(db_generation.__table__, "after_create")
+def _insert_db_generation(table, connection, **kw):
+    connection.execute(
+        insert(table).values(generation_name=DB_GENERATION_NAME, generation=0)
+    )
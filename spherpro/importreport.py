@@ -0,0 +1,126 @@
+# Performance report of the data import
+import contextlib
+import json
+import logging
+import sys
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+COL_STAGE = "stage"
+COL_SECONDS = "seconds"
+COL_ROWS = "rows"
+COL_ROWS_PER_S = "rows_per_s"
+# ru_maxrss is the peak of the whole process up to the end of a stage,
+# not the peak within the stage
+COL_PEAK_RSS = "process_peak_rss_mb"
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size in MB of this process and its
+    finished child processes so far, None if not available.
+
+    The value never decreases: it is the peak since the process started,
+    not the peak of the current stage.
+    """
+    if resource is None:
+        return None
+    rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return rss / 2 ** 20
+    return rss / 2 ** 10
+
+
+class ImportStage:
+    """
+    A stage of the import. The rows processed can be set
+    while the stage is running.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+
+class ImportReport:
+    """
+    Collects wall time, rows processed, rows/s and the process peak RSS
+    so far at the end of the stages of an import.
+    """
+
+    def __init__(self, count_rows=None):
+        """
+        Args:
+            count_rows: a function returning a running count of written rows,
+                used for stages that do not set their rows explicitly.
+        """
+        self.count_rows = count_rows
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times a stage of the import.
+
+        Args:
+            name: the name of the stage
+        Yields:
+            an ImportStage, its rows can be set by the caller
+        """
+        stage = ImportStage(name)
+        rows_start = self.count_rows() if self.count_rows is not None else None
+        t_start = time.perf_counter()
+        yield stage
+        seconds = time.perf_counter() - t_start
+        rows = stage.rows
+        if rows is None and rows_start is not None:
+            rows = self.count_rows() - rows_start
+        self.stages.append(
+            {
+                COL_STAGE: name,
+                COL_SECONDS: seconds,
+                COL_ROWS: rows,
+                COL_ROWS_PER_S: rows / seconds if rows and seconds > 0 else None,
+                COL_PEAK_RSS: get_peak_rss(),
+            }
+        )
+        logging.info(
+            f"{name}: {seconds:.2f}s, {rows} rows,"
+            f" process peak RSS so far {self.stages[-1][COL_PEAK_RSS]} MB"
+        )
+
+    @property
+    def seconds(self):
+        """
+        Total wall time of all stages
+        """
+        return sum(s[COL_SECONDS] for s in self.stages)
+
+    def to_dataframe(self):
+        """
+        Returns the stages as a dataframe
+        """
+        return pd.DataFrame(
+            self.stages,
+            columns=[COL_STAGE, COL_SECONDS, COL_ROWS, COL_ROWS_PER_S, COL_PEAK_RSS],
+        )
+
+    def to_json(self, filename):
+        """
+        Writes the stages to a json file
+        """
+        with open(filename, "w") as f:
+            json.dump({"stages": self.stages, COL_SECONDS: self.seconds}, f, indent=2)
+
+    def __repr__(self):
+        return self.to_dataframe().to_string(index=False)
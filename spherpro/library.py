@@ -1,7 +1,12 @@
+import functools
+import glob
+import hashlib
 import os
 import re
+import shutil
+import tempfile
 
-import networkx as nx
+import numpy as np
 import pandas as pd
 
 import spherpro.configuration as conf
@@ -59,6 +64,54 @@ def find_measurementmeta(stack_name, col_name, no_stack_str=None, no_plane_strin
     return pd.Series([col_name, mtype, name, stack, plane])
 
 
+def find_measurementmetas(
+    stack_names, col_names, no_stack_str=None, no_plane_string=None
+):
+    """
+    finds the measurement meta information of a list of column names
+
+    Vectorized version of find_measurementmeta: all columns are parsed
+    in one pass and the result is memoized per stacks and columns.
+
+    Args:
+        stack_names: an iterable containing a name for all known stacks.
+        col_names: an iterable of column names.
+
+    Returns:
+        Returns a pandas.DataFrame with a row per column name and the
+        following columns in this order:
+        x | measurement type | measurement name | stack name | plane id
+        Rows of columns that could not be parsed contain empty strings.
+    """
+    return _find_measurementmetas(
+        frozenset(stack_names), tuple(col_names), no_stack_str, no_plane_string
+    ).copy()
+
+
+@functools.lru_cache(maxsize=32)
+def _find_measurementmetas(stack_names, col_names, no_stack_str, no_plane_string):
+    # longer names first, such that a stack name that is a suffix
+    # of an other one does not shadow it
+    stacks = sorted(stack_names, key=lambda x: (-len(x), x))
+    stackpattern = "(" + "|".join(re.escape(s) for s in stacks) + ")"
+    cols = pd.Series(col_names, dtype=object)
+    pre = cols.str.extract(r"^([^_]*)_(.*)")
+    post = pre[1].str.extract("(.*)_" + stackpattern + r"_(c\d+)")
+    has_pre = pre[0].notnull()
+    has_post = post[0].notnull()
+    meta = pd.DataFrame(
+        {
+            0: cols,
+            1: pre[0],
+            2: post[0].where(has_post, pre[1]),
+            3: post[1].where(has_post, no_stack_str),
+            4: post[2].where(has_post, no_plane_string),
+        }
+    )
+    meta.loc[~has_pre, :] = ""
+    return meta
+
+
 def construct_in_clause_list(key_dict):
     """
     Construnct a list of IN clauses.
@@ -102,18 +155,143 @@ def filter_and_rename_dict(indict, filterdict):
     return outdict
 
 
-def read_csv_from_config(configdict, base_dir=None):
+def read_csv_from_config(configdict, base_dir=None, chunksize=None, cache_dir=None):
     """
     Read the CSV from a configuration entry.
+
+    If a chunksize is given, an iterator over chunks is returned.
     """
     path = configdict[conf.PATH]
     sep = configdict[conf.SEP]
     if base_dir is not None:
         path = os.path.join(base_dir, path)
-    dat = pd.read_csv(path, sep=sep)
+    dat = read_csv_cached(path, sep=sep, chunksize=chunksize, cache_dir=cache_dir)
     return dat
 
 
+# rows per parquet file and row group of a cache entry
+CACHE_PART_SIZE = 10 ** 6
+CACHE_ROW_GROUP_SIZE = 100000
+
+
+def read_csv_cached(path, sep, chunksize=None, cache_dir=None):
+    """
+    Reads a CSV through a parquet cache.
+
+    On the first read the CSV is converted to parquet files in the
+    cache_dir, later reads load the parquet files instead of parsing
+    the CSV. The cache is keyed by the path, size and modification time
+    of the CSV, outdated cache entries are removed.
+    Without a cache_dir, or if pyarrow is not installed, this is
+    equivalent to pd.read_csv.
+
+    Args:
+        path: the CSV file
+        sep: the separator
+        chunksize: if not None, an iterator over chunks is returned
+        cache_dir: the cache folder
+
+    Returns:
+        A dataframe or an iterator over dataframes
+    """
+    pa = _import_pyarrow()
+    if cache_dir is None or pa is None:
+        return pd.read_csv(path, sep=sep, chunksize=chunksize)
+    fn_cache = _get_csv_cache_name(path, sep, cache_dir)
+    if not os.path.exists(fn_cache):
+        _write_csv_cache(path, sep, fn_cache)
+    reader = _read_csv_cache(fn_cache, chunksize)
+    if chunksize is None:
+        reader = pd.concat(reader, ignore_index=True)
+    return reader
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow on first use, returns None if it is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _get_csv_cache_prefix(path, cache_dir):
+    """
+    Returns the prefix of all cache entries of a CSV, identified by
+    the hash of its absolute path.
+    """
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}_{key}_")
+
+
+def _get_csv_cache_name(path, sep, cache_dir):
+    stat = os.stat(path)
+    key = "|".join([str(stat.st_size), str(stat.st_mtime_ns), sep])
+    key = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return _get_csv_cache_prefix(path, cache_dir) + key
+
+
+def _write_csv_cache(path, sep, fn_cache):
+    """
+    Converts a CSV into a folder of parquet files of CACHE_PART_SIZE rows.
+
+    The folder is written under a temporary name and renamed when
+    complete, such that concurrent readers never see partial caches.
+    Afterwards the outdated cache entries of the same CSV are removed.
+    """
+    pa = _import_pyarrow()
+    cache_dir = os.path.dirname(fn_cache)
+    os.makedirs(cache_dir, exist_ok=True)
+    fn_tmp = tempfile.mkdtemp(dir=cache_dir)
+    reader = pd.read_csv(path, sep=sep, chunksize=CACHE_PART_SIZE)
+    for i, dat in enumerate(reader):
+        pa.parquet.write_table(
+            pa.Table.from_pandas(dat, preserve_index=False),
+            os.path.join(fn_tmp, f"part_{i:05d}.parquet"),
+            row_group_size=CACHE_ROW_GROUP_SIZE,
+        )
+    if not os.path.exists(os.path.join(fn_tmp, "part_00000.parquet")):
+        # empty file: keep the header
+        dat = pd.read_csv(path, sep=sep, nrows=0)
+        pa.parquet.write_table(
+            pa.Table.from_pandas(dat, preserve_index=False),
+            os.path.join(fn_tmp, "part_00000.parquet"),
+        )
+    try:
+        os.rename(fn_tmp, fn_cache)
+    except OSError:
+        # written concurrently by an other process
+        shutil.rmtree(fn_tmp, ignore_errors=True)
+    prefix = _get_csv_cache_prefix(path, cache_dir)
+    for fn_old in glob.glob(glob.escape(prefix) + "*"):
+        if fn_old != fn_cache:
+            shutil.rmtree(fn_old, ignore_errors=True)
+
+
+def _read_csv_cache(fn_cache, chunksize):
+    """
+    Reads a cache folder written by _write_csv_cache chunk by chunk.
+
+    As pd.read_csv, the chunks are indexed by the row number.
+    """
+    pa = _import_pyarrow()
+    nstart = 0
+    for fn in sorted(glob.glob(os.path.join(glob.escape(fn_cache), "*.parquet"))):
+        pfile = pa.parquet.ParquetFile(fn)
+        if chunksize is None:
+            batches = [pfile.read()]
+        else:
+            batches = pfile.iter_batches(batch_size=chunksize)
+        for batch in batches:
+            dat = batch.to_pandas()
+            dat.index = pd.RangeIndex(nstart, nstart + dat.shape[0])
+            nstart += dat.shape[0]
+            yield dat
+
+
 def map_group_re(x, re_str):
     """
     Maps a regular expression with matchgroups
@@ -123,14 +301,16 @@ def map_group_re(x, re_str):
         x: iterable
         re_str: a regular expression string with matchgroups
     Return:
-        A dataframe with column names being matchgroups
+        A dataframe with column names being matchgroups,
+        with one row per element of x. Elements that do not match
+        result in missing values.
 
     """
     qre = re.compile(re_str)
-    m_list = [
-        pd.DataFrame.from_dict([m.groupdict() for m in qre.finditer(s)]) for s in x
-    ]
-    return pd.concat(m_list, ignore_index=True)
+    x = pd.Series(np.asarray(x, dtype=object), dtype=object)
+    dat = x.str.extract(qre, expand=True)
+    # only keep the named groups, in the order of the expression
+    return dat.loc[:, sorted(qre.groupindex, key=qre.groupindex.get)]
 
 
 def get_largest_commponent_objs(dat, keys=None):
@@ -148,6 +328,8 @@ def get_largest_commponent_objs(dat, keys=None):
             db.object_relations.object_id_parent.key,
             db.object_relations.object_id_child.key,
         ]
+    import networkx as nx
+
     g = nx.from_pandas_edgelist(dat[keys], source=keys[0], target=keys[1])
     gmax = max(nx.connected_components(g), key=len)
     return pd.Series((int(n) for n in gmax), name=db.objects.object_id.key)